@@ -0,0 +1,69 @@
+"""
+Compares strptime against src.weather.timestamps on a 384 hour series.
+
+    python -m benchmarks.bench_timestamps [--hours 384] [--repeat 50]
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+from src.weather.timestamps import TimeSeries
+
+
+def make_times(hours: int) -> list[str]:
+    start = datetime(2024, 1, 1)
+    return [
+        (start + timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M') for i in range(hours)
+    ]
+
+
+def parse_strptime(times: list[str]) -> list[datetime]:
+    return [datetime.strptime(t, '%Y-%m-%dT%H:%M') for t in times]
+
+
+def parse_fromisoformat(times: list[str]) -> list[datetime]:
+    return [datetime.fromisoformat(t) for t in times]
+
+
+def decode_all(times: list[str]) -> list[datetime]:
+    return list(TimeSeries(times))
+
+
+def decode_irregular(times: list[str]) -> list[datetime]:
+    # drop an hour in the middle, like a DST change, to time the fallback path
+    return list(TimeSeries(times[: len(times) // 2] + times[len(times) // 2 + 1 :]))
+
+
+def decode_four(times: list[str]) -> list[datetime]:
+    # what the hourly display actually reads
+    return TimeSeries(times)[2:10:2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type=int, default=384)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    times = make_times(args.hours)
+    assert decode_all(times) == parse_strptime(times)
+
+    cases = [
+        ('strptime', parse_strptime),
+        ('fromisoformat', parse_fromisoformat),
+        ('TimeSeries (all)', decode_all),
+        ('TimeSeries (irregular)', decode_irregular),
+        ('TimeSeries (4 rows)', decode_four),
+    ]
+
+    print(f'{args.hours} timestamps, best of {args.repeat} runs')
+    baseline = None
+    for name, fn in cases:
+        best = min(timeit.repeat(lambda: fn(times), number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f'  {name:<24} {best * 1e6:>10.1f} us  {baseline / best:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
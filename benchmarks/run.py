@@ -0,0 +1,288 @@
+"""
+Offline benchmarks for the fetch -> parse -> frame path, on the fixtures in
+benchmarks/fixtures (see benchmarks.payloads). The HTTP call is stubbed and the
+displays are lcd_mock, so this runs anywhere.
+
+    python -m benchmarks.run                    # run and compare to the baseline
+    python -m benchmarks.run --save-baseline    # run and store as the new baseline
+    python -m benchmarks.run --filter parse     # only cases whose name contains 'parse'
+
+Baselines are per machine (a dev box and a Pi Zero are nowhere near each other),
+so record one on the machine you compare on. That's why benchmarks/baseline.json
+is deliberately not committed (it's in .gitignore): one from another machine
+would only flag differences in hardware. Exits with 1 if any case got slower or
+bigger than the baseline by more than --tolerance.
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable, Optional, TypedDict
+from unittest import mock
+
+from benchmarks.payloads import HORIZONS, load_payload
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+class Result(TypedDict):
+    best: float  # seconds per call
+    median: float  # seconds per call
+    peak_kib: float  # peak traced allocation during one call
+
+
+class Case(TypedDict):
+    name: str
+    setup: Callable[[], Any]
+    run: Callable[[Any], Any]
+    number: int  # calls per timed sample, for cases too fast to time one at a time
+
+
+class _FakeResponse:
+    def __init__(self, body: bytes) -> None:
+        self.status_code = 200
+        self.content = body
+        self.text = body.decode('utf-8')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+def measure(case: Case, repeat: int) -> Result:
+    samples = []
+    for _ in range(repeat):
+        state = case['setup']()
+        start = time.perf_counter()
+        for _ in range(case['number']):
+            case['run'](state)
+        samples.append((time.perf_counter() - start) / case['number'])
+
+    state = case['setup']()
+    tracemalloc.start()
+    case['run'](state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'best': min(samples),
+        'median': statistics.median(samples),
+        'peak_kib': peak / 1024,
+    }
+
+
+def _quiet_lcd_manager():
+    from src.lcd.lcd_manager import LcdManager
+
+    lcd_manager = LcdManager(is_dev=True)
+    lcd_manager.renderer.stop()  # keep lcd_mock, but don't draw every frame
+    # frames are pushed explicitly below, not on the scheduler's timing
+    lcd_manager.scheduler.stop()
+    return lcd_manager
+
+
+def get_cases() -> list[Case]:
+    from src import main
+    from src.weather import open_meteo
+
+    lcd_manager = _quiet_lcd_manager()
+    text_parts = [
+        ['=58°', '≈56°', 'Pt.Cl.'],
+        ['≋6/14SW', '⸪61%'],
+    ]
+
+    cases: list[Case] = []
+    for hours in HORIZONS:
+        payload = load_payload(hours)
+        body = json.dumps(payload).encode('utf-8')
+
+        def get_weather(_, body=body):
+            open_meteo._parsed.clear()  # time the parse, not the unchanged shortcut
+            with mock.patch.object(
+                open_meteo.client, 'get', return_value=_FakeResponse(body)
+            ):
+                return open_meteo.get_weather(44.9778, -93.2650)
+
+        def hourly_forecast(_, payload=payload):
+            return list(open_meteo._get_hourly_forecast(payload))
+
+        def daily_forecast(_, payload=payload):
+            hourly = open_meteo._get_hourly_forecast(payload)
+            return list(open_meteo._get_forecast(payload, hourly))
+
+        def frames(_, payload=payload):
+            lcd_manager._pages.clear()  # compile every page, not just changed ones
+            weather = open_meteo._parse(payload, time.time())
+            main.display_weather(
+                lcd_manager, {'Minneapolis': weather}, stale_after=math.inf
+            )
+            for lcd_index in range(len(lcd_manager.lcds)):
+                for part in lcd_manager.scheduler.rotation(lcd_index):
+                    lcd_manager.show_frame(lcd_index, part.frame)
+            lcd_manager.flush()
+
+        def unchanged_frames(weather):
+            # a refresh where nothing visible changed
+            main.display_weather(
+                lcd_manager, {'Minneapolis': weather}, stale_after=math.inf
+            )
+
+        def parsed_and_shown(payload=payload):
+            weather = open_meteo._parse(payload, time.time())
+            main.display_weather(
+                lcd_manager, {'Minneapolis': weather}, stale_after=math.inf
+            )
+            return weather
+
+        cases += [
+            {
+                'name': f'get_weather/{hours}h',
+                'setup': lambda: None,
+                'run': get_weather,
+                'number': 1,
+            },
+            {
+                'name': f'hourly_forecast/{hours}h',
+                'setup': lambda: None,
+                'run': hourly_forecast,
+                'number': 1,
+            },
+            {
+                'name': f'daily_forecast/{hours}h',
+                'setup': lambda: None,
+                'run': daily_forecast,
+                'number': 1,
+            },
+            {
+                'name': f'frames/{hours}h',
+                'setup': lambda: None,
+                'run': frames,
+                'number': 1,
+            },
+            {
+                'name': f'frames_unchanged/{hours}h',
+                'setup': parsed_and_shown,
+                'run': unchanged_frames,
+                'number': 10,
+            },
+        ]
+
+    from src.lcd.lcd_i2c import LCD as I2cLCD, FakeExpander
+    from src.utils import justify_text_parts
+
+    # encoding frames for a PCF8574 backpack, the bus itself is faked
+    i2c_lcd = I2cLCD(i2c=FakeExpander(decode=False))
+    i2c_lcd.begin()  # the init sequence sleeps, keep it out of the timings
+    i2c_frames = i2c_lcd.compile_frames(
+        [
+            '\n'.join(justify_text_parts(parts, 16) for parts in text_parts),
+            '\n'.join(justify_text_parts(parts[::-1], 16) for parts in text_parts),
+        ]
+    )
+
+    def i2c_show(_):
+        for frame in i2c_frames:
+            i2c_lcd.show(frame)
+        i2c_lcd.lcd.i2c.transactions.clear()
+
+    cases += [
+        {
+            'name': 'justify_text_parts',
+            'setup': lambda: None,
+            'run': lambda _: [justify_text_parts(parts, 16) for parts in text_parts],
+            'number': 1000,
+        },
+        {
+            'name': 'set_text_parts',
+            'setup': lambda: None,
+            'run': lambda _: (
+                lcd_manager.set_text_parts(0, text_parts),
+                lcd_manager.flush(),
+            ),
+            'number': 100,
+        },
+        {
+            'name': 'i2c_show',
+            'setup': lambda: None,
+            'run': i2c_show,
+            'number': 100,
+        },
+    ]
+    return cases
+
+
+def load_baseline() -> Optional[dict[str, Result]]:
+    try:
+        with open(BASELINE_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _format_change(value: float, baseline: Optional[float]) -> str:
+    if not baseline:
+        return ''
+    return f'{(value / baseline - 1) * 100:+.0f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--filter', type=str, default='')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.25,
+        help='Allowed slowdown or memory growth vs the baseline. Default is 0.25 (25%%)',
+    )
+    args = parser.parse_args()
+
+    baseline = load_baseline() or {}
+    results: dict[str, Result] = {}
+    regressions = []
+
+    print(
+        f'{"case":<26}{"best":>12}{"median":>12}{"peak KiB":>10}{"time":>8}{"mem":>8}'
+    )
+    for case in get_cases():
+        if args.filter not in case['name']:
+            continue
+        result = measure(case, args.repeat)
+        results[case['name']] = result
+
+        base = baseline.get(case['name'])
+        time_change = _format_change(result['best'], base and base['best'])
+        mem_change = _format_change(result['peak_kib'], base and base['peak_kib'])
+        print(
+            f'{case["name"]:<26}'
+            f'{result["best"] * 1e3:>10.3f}ms'
+            f'{result["median"] * 1e3:>10.3f}ms'
+            f'{result["peak_kib"]:>10.1f}'
+            f'{time_change:>8}{mem_change:>8}'
+        )
+
+        if base and (
+            result['best'] > base['best'] * (1 + args.tolerance)
+            or result['peak_kib'] > base['peak_kib'] * (1 + args.tolerance)
+        ):
+            regressions.append(case['name'])
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({**baseline, **results}, f, indent=2, sort_keys=True)
+        print(f'Saved baseline to {BASELINE_PATH}')
+    elif not baseline:
+        print('No baseline yet, run with --save-baseline to record one')
+
+    if regressions and not args.save_baseline:
+        print(f'Regressed beyond {args.tolerance:.0%}: {", ".join(regressions)}')
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 import os
-import requests
 
 from src.types import CurrentWeather
+from src.weather import client
 
 api_key = os.getenv('API_KEY')
 api_key_param = {'key': api_key}
@@ -15,17 +15,17 @@ headers = {}
 
 def get_weather(q='55418') -> CurrentWeather:
     url = f'{base_url}/current.json'
-    response = requests.get(url, params={'q': q, **api_key_param})
+    response = client.get(url, params={'q': q, **api_key_param})
     current = response.json()['current']
 
-    return {
-        'temp': round(current['temp_f']),
-        'condition': current['condition']['text'],
-        'wind': round(current['wind_mph']),
-        'wind_dir': current['wind_dir'],
-        'humidity': current['humidity'],
-        'cloud': current['cloud'],
-        'feels_like': round(current['feelslike_f']),
-        'heat_index': round(current['heatindex_f']),
-        'uv': current['uv']
-    }
+    return CurrentWeather(
+        temp=round(current['temp_f']),
+        condition=current['condition']['text'],
+        wind_speed=round(current['wind_mph']),
+        wind_gusts=round(current['gust_mph']),
+        wind_dir=current['wind_dir'],
+        humidity=current['humidity'],
+        cloud_cover=current['cloud'],
+        feels_like=round(current['feelslike_f']),
+        uv=round(current['uv']),
+    )
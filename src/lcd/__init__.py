@@ -1,7 +1,82 @@
-def get_lcd_class(is_dev: bool):
+import json
+
+from src.startup import PROFILE
+from src.types import BusConfig
+
+BUS_PINS = ('rs', 'd4', 'd5', 'd6', 'd7')
+DRIVERS = ('gpio', 'i2c')
+
+
+def get_lcd_class(is_dev: bool, driver: str = 'gpio'):
+    with PROFILE.stage(f'import LCD driver ({driver})'):
+        if is_dev:
+            from src.lcd.lcd_mock import LCD as _LCD
+        elif driver == 'i2c':
+            from src.lcd.lcd_i2c import LCD as _LCD  # type: ignore
+        else:
+            from src.lcd.lcd import LCD as _LCD  # type: ignore
+
+    return _LCD
+
+
+def get_default_buses(is_dev: bool) -> list[BusConfig]:
     if is_dev:
-        from src.lcd.lcd_mock import LCD as _LCD, PINS as _PINS
+        from src.lcd.lcd_mock import BUSES as _BUSES
     else:
-        from src.lcd.lcd import LCD as _LCD, PINS as _PINS  # type: ignore
+        from src.lcd.lcd import BUSES as _BUSES  # type: ignore
+
+    return _BUSES
+
+
+def load_buses(path: str) -> list[BusConfig]:
+    """
+    Reads the displays from a JSON file, in place of the built-in single bus:
+
+        [
+            {
+                "name": "left",
+                "pins": {"rs": "D5", "d4": "D6", "d5": "D13", "d6": "D19", "d7": "D26"},
+                "displays": [{"en": "D16", "width": 20, "height": 4}]
+            },
+            {
+                "name": "backpacks",
+                "driver": "i2c",
+                "displays": [{"address": 39}, {"address": 38}]
+            }
+        ]
+
+    "driver" is "gpio" (the default) or "i2c" for PCF8574 backpacks, whose pins
+    are optional ({"scl": "SCL", "sda": "SDA"}). LCDs are numbered in file order,
+    across buses.
+    """
+    with open(path) as f:
+        buses = json.load(f)
+    if not isinstance(buses, list) or not buses:
+        raise ValueError(f'{path}: expected a list of buses')
 
-    return _LCD, _PINS
+    for index, bus in enumerate(buses):
+        bus.setdefault('name', f'bus{index}')
+        bus.setdefault('driver', 'gpio')
+        bus.setdefault('pins', {})
+        if bus['driver'] not in DRIVERS:
+            raise ValueError(f'{path}: unknown driver {bus["driver"]!r}')
+        if bus['driver'] == 'gpio':
+            missing = [pin for pin in BUS_PINS if pin not in bus['pins']]
+            if missing:
+                raise ValueError(
+                    f'{path}: bus {bus["name"]} has no {", ".join(missing)}'
+                )
+        # each display is picked out by its enable pin on GPIO, its address on I2C
+        selector = 'en' if bus['driver'] == 'gpio' else 'address'
+        if not bus.get('displays'):
+            raise ValueError(f'{path}: bus {bus["name"]} has no displays')
+        for display in bus['displays']:
+            if selector not in display:
+                raise ValueError(
+                    f'{path}: a display on {bus["name"]} has no {selector}'
+                )
+            display.setdefault('width', 16)
+            display.setdefault('height', 2)
+            if display['width'] < 1 or display['height'] < 1:
+                raise ValueError(f'{path}: bad display size on bus {bus["name"]}')
+    return buses
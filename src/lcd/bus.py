@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+import traceback
+from typing import Any, Callable, Optional, Sequence
+
+from src import metrics
+from src.types import Frame
+
+
+logger = logging.getLogger(__name__)
+
+FRAMES = metrics.counter('kitchenpi_frames_total', 'Frames written to an LCD')
+FRAMES_SKIPPED = metrics.counter(
+    'kitchenpi_frames_skipped_total',
+    'Frames not written because the LCD was already showing them',
+)
+FRAMES_DROPPED = metrics.counter(
+    'kitchenpi_frames_dropped_total',
+    'Frames replaced by a newer one for the same LCD before they were written',
+)
+FRAME_WRITE_SECONDS = metrics.histogram(
+    'kitchenpi_frame_write_seconds', 'Time to write one frame to an LCD'
+)
+
+
+class BusWriter(threading.Thread):
+    """
+    The only thread that writes to a set of LCDs sharing a data bus. Producers
+    submit() frames and return immediately. Only the latest pending frame per LCD is
+    kept, so a burst of updates never queues up stale frames, and LCDs with pending
+    frames are written round-robin so one busy display can't starve the others.
+
+    Every bus gets its own writer, so separate buses are written in parallel.
+    LCD indexes are the bus's own; offset is where its LCDs start in the overall
+    numbering, which is what the metrics labels and on_write use.
+    """
+
+    def __init__(
+        self,
+        lcds: Sequence[Any],
+        on_write: Optional[Callable[[int], None]] = None,
+        name: str = 'lcd-bus',
+        offset: int = 0,
+        init_gap: float = 0.0,
+    ) -> None:
+        super().__init__(daemon=True, name=name)
+        self.lcds = lcds
+        self.on_write = on_write
+        self.offset = offset
+        self.init_gap = init_gap  # seconds between initializing the LCDs
+        self._pending: dict[int, Frame] = {}
+        self._next_index = 0  # where the round-robin scan starts
+        self._busy = False
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._exited = False
+
+    def submit(self, lcd_index: int, frame: Frame) -> None:
+        if not 0 <= lcd_index < len(self.lcds):
+            raise IndexError(f'No LCD {lcd_index} on bus {self.name}')
+        start = time.perf_counter()
+        with self._condition:
+            metrics.LOCK_WAIT_SECONDS.observe(
+                time.perf_counter() - start, labels={'lock': self.name}
+            )
+            if lcd_index in self._pending:
+                FRAMES_DROPPED.inc(labels={'lcd': str(self.offset + lcd_index)})
+            self._pending[lcd_index] = frame
+            self._condition.notify_all()
+
+    def _take(self) -> Optional[tuple[int, Frame]]:
+        # called with the condition held
+        while not self._stopped and not self._pending:
+            self._condition.wait()
+        if not self._pending:
+            return None  # stopped, with everything submitted written
+
+        num_lcds = len(self.lcds)
+        lcd_index = next(
+            index
+            for index in (
+                (self._next_index + offset) % num_lcds for offset in range(num_lcds)
+            )
+            if index in self._pending
+        )
+        self._next_index = (lcd_index + 1) % num_lcds
+        return lcd_index, self._pending.pop(lcd_index)
+
+    def run(self):
+        # the displays are set up here rather than when they're created, so slow
+        # hardware init overlaps with the rest of startup instead of holding it up
+        for lcd_index, lcd in enumerate(self.lcds):
+            if lcd_index and self.init_gap:
+                time.sleep(self.init_gap)
+            try:
+                lcd.begin()
+            except Exception as e:
+                # show() tries again before the first frame
+                logger.error(f'Failed to initialize LCD {self.offset + lcd_index}: {e}')
+                logger.debug(traceback.format_exc())
+
+        while True:
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+                item = self._take()
+                if item is None:
+                    self._exited = True
+                    self._condition.notify_all()
+                    return
+                self._busy = True
+
+            lcd_index, frame = item
+            labels = {'lcd': str(self.offset + lcd_index)}
+            try:
+                start = time.perf_counter()
+                written = self.lcds[lcd_index].show(frame)
+                if not written:
+                    FRAMES_SKIPPED.inc(labels=labels)
+                    continue
+                FRAME_WRITE_SECONDS.observe(time.perf_counter() - start, labels)
+                FRAMES.inc(labels=labels)
+                if self.on_write:
+                    self.on_write(self.offset + lcd_index)
+            except Exception as e:
+                logger.error(f'Failed to write to LCD {self.offset + lcd_index}: {e}')
+                logger.debug(traceback.format_exc())
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every submitted frame has been written."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._exited or (not self._pending and not self._busy),
+                timeout,
+            )
+
+    def stop(self):
+        """
+        Ends the thread once the frames already submitted are written, so the
+        displays are left showing the last ones. join() to wait for that.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
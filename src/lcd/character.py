@@ -0,0 +1,110 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+from src.lcd.glyphs import CgramState, GlyphManager
+from src.startup import PROFILE
+from src.types import Frame
+from src.utils import changed_runs, frame_lines
+
+logger = logging.getLogger(__name__)
+
+# each run costs a cursor command before and inside the message write, so writing up
+# to two unchanged cells is no slower than starting a new run
+_MAX_GAP = 2
+
+
+class CharacterLCD(ABC):
+    """
+    What every HD44780 display has in common, whatever it's wired to: glyphs,
+    compiled frames, and only rewriting the cells that change between frames.
+    Subclasses provide _create_driver(), returning something with the
+    cursor_position, message, create_char and clear of Adafruit's
+    Character_LCD_Mono.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        width: int,
+        height: int,
+        cgram_state: Optional[CgramState] = None,
+    ) -> None:
+        self.name = name
+        # the display itself is only set up by begin(), on the thread that writes to it
+        self.lcd: Any = None
+        self.glyphs = GlyphManager(
+            lambda slot, bitmap: self.lcd.create_char(slot, bitmap),
+            state=cgram_state,
+            state_key=name,
+        )
+        self.text = ''
+        self.width = width
+        self.height = height
+        # what is currently on the screen (translated), width * height cells
+        self._data = self._blank_data()
+        self.digest = hash(self._data)
+
+    @abstractmethod
+    def _create_driver(self) -> Any: ...
+
+    def begin(self) -> None:
+        """
+        Initializes the display, if it isn't yet. The bus writer calls this when it
+        starts (and show() before every write, in case that failed), so the slow part
+        of startup happens on its thread.
+        """
+        if self.lcd is not None:
+            return
+        with PROFILE.stage(f'init LCD {self.name}'):
+            self.lcd = self._create_driver()
+
+    @property
+    def glyph_epoch(self) -> int:
+        # frames compiled under an older epoch need compiling again, see show()
+        return self.glyphs.epoch
+
+    def _blank_data(self) -> bytes:
+        return b' ' * (self.width * self.height)
+
+    def compile_frames(self, texts: list[str]) -> list[Frame]:
+        translated, epoch = self.glyphs.prepare(texts)
+        frames = []
+        for text, translated_text in zip(texts, translated):
+            lines = frame_lines(translated_text, self.width, self.height)
+            data = ''.join(lines).encode('latin-1', errors='replace')
+            frames.append(Frame(text, data, hash(data), epoch))
+        return frames
+
+    def show(self, frame: Frame) -> bool:
+        self.begin()
+        if frame.glyph_epoch != self.glyphs.epoch:
+            # another frame moved glyphs around since this was compiled
+            frame = self.compile_frames([frame.text])[0]
+        self.glyphs.flush()
+        if frame.digest == self.digest and frame.data == self._data:
+            return False
+
+        # only rewrite the cells that changed, clear() is slow and makes the screen flicker
+        for row in range(self.height):
+            line_start = row * self.width
+            line_end = line_start + self.width
+            old_line = self._data[line_start:line_end]
+            new_line = frame.data[line_start:line_end]
+            for start, end in changed_runs(old_line, new_line, max_gap=_MAX_GAP):
+                self.lcd.cursor_position(start, row)
+                self.lcd.message = new_line[start:end].decode('latin-1')
+        self._data = frame.data
+        self.digest = frame.digest
+        self.text = frame.text
+        return True
+
+    def set_text(self, text: str):
+        self.show(self.compile_frames([text])[0])
+
+    def clear(self):
+        self.begin()
+        self.lcd.clear()
+        self._data = self._blank_data()
+        self.digest = hash(self._data)
+        self.text = ''
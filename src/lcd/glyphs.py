@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+
+logger = logging.getLogger(__name__)
+
+CGRAM_SLOTS = 8
+
+
+class Glyph(NamedTuple):
+    bitmap: list[int]  # 8 rows of 5 bits
+    fallback: str  # shown when all the CGRAM slots are needed by other glyphs
+
+
+# https://www.quinapalus.com/hd44780udg.html
+GLYPHS: dict[str, Glyph] = {
+    '°': Glyph([4, 10, 4, 0, 0, 0, 0, 0], 'o'),
+    '≈': Glyph([0, 8, 21, 2, 8, 21, 2, 0], '='),
+    '≋': Glyph([8, 21, 2, 8, 21, 2, 24, 7], 'W'),
+    '⸪': Glyph([18, 18, 9, 9, 18, 18, 9, 9], 'H'),
+    '☁': Glyph([10, 21, 31, 0, 0, 0, 0, 0], 'C'),
+    '🌧': Glyph([10, 21, 31, 0, 4, 21, 21, 17], 'P'),
+    '☼': Glyph([4, 21, 14, 27, 14, 21, 4, 0], 'U'),
+    # the HD44780 ROM has an arrow where ASCII has ~
+    '~': Glyph([0, 0, 8, 21, 2, 0, 0, 0], '-'),
+    '↑': Glyph([4, 14, 21, 4, 4, 4, 4, 0], '^'),
+    '↓': Glyph([4, 4, 4, 4, 21, 14, 4, 0], 'v'),
+    # ROM codes 0x7E and 0x7F are right and left arrows
+    '→': Glyph([0, 4, 2, 31, 2, 4, 0, 0], '\x7e'),
+    '←': Glyph([0, 4, 8, 31, 8, 4, 0, 0], '\x7f'),
+    '↗': Glyph([15, 3, 5, 9, 16, 0, 0, 0], '/'),
+    '↘': Glyph([16, 9, 5, 3, 15, 0, 0, 0], '\\'),
+    '↙': Glyph([1, 18, 20, 24, 30, 0, 0, 0], '/'),
+    '↖': Glyph([30, 24, 20, 18, 1, 0, 0, 0], '\\'),
+}
+
+
+def _boot_id() -> Optional[str]:
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class CgramState:
+    """
+    Remembers which glyph is in which CGRAM slot of each LCD, in a small JSON file.
+    CGRAM keeps its contents for as long as the LCD has power, so after a restart
+    the glyphs that are already there don't need to be programmed again. The file is
+    tied to the kernel's boot id and ignored after a reboot; without a boot id
+    (not Linux) nothing is remembered.
+    """
+
+    def __init__(self, path: str, boot_id: Optional[str] = None) -> None:
+        self.path = path
+        self.boot_id = boot_id or _boot_id()
+        self._lock = threading.Lock()
+        self._lcds: dict[str, dict[str, list]] = self._load()
+
+    def _load(self) -> dict[str, dict[str, list]]:
+        if not self.boot_id:
+            return {}
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(state, dict) or state.get('boot_id') != self.boot_id:
+            return {}
+        return state.get('lcds', {})
+
+    def slots(self, key: str, catalog: dict[str, Glyph]) -> dict[str, int]:
+        """The glyphs already in the LCD's CGRAM, if they still look the same."""
+        with self._lock:
+            loaded = self._lcds.get(key, {})
+        return {
+            char: slot
+            for char, (slot, bitmap) in loaded.items()
+            if char in catalog and catalog[char].bitmap == bitmap
+        }
+
+    def update(
+        self, key: str, slots: dict[str, int], catalog: dict[str, Glyph]
+    ) -> None:
+        if not self.boot_id:
+            return
+        with self._lock:
+            self._lcds[key] = {
+                char: [slot, catalog[char].bitmap] for char, slot in slots.items()
+            }
+            state = {'boot_id': self.boot_id, 'lcds': self._lcds}
+            tmp_path = f'{self.path}.tmp'
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(tmp_path, 'w') as f:
+                    json.dump(state, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.error(f'Failed to save CGRAM state to {self.path}: {e}')
+
+
+class GlyphManager:
+    """
+    Maps an unlimited glyph catalog onto the 8 CGRAM slots. prepare() works out the
+    glyphs a set of texts uses, assigns missing ones to free or least recently used
+    slots (never one the same texts need), and translates them with a single
+    str.translate table that's updated as slots change.
+
+    prepare() never touches the hardware, so frames can be compiled on any thread:
+    slot changes are queued and written by flush(), which the thread that owns the
+    display calls right before writing a frame. epoch changes whenever a slot is
+    reassigned, so a translation made under an older epoch can be detected.
+
+    With a CgramState, glyphs a previous run left in CGRAM are used as they are,
+    and the slots are saved again whenever they change.
+    """
+
+    def __init__(
+        self,
+        create_char: Callable[[int, list[int]], None],
+        catalog: dict[str, Glyph] = GLYPHS,
+        slots: int = CGRAM_SLOTS,
+        state: Optional[CgramState] = None,
+        state_key: str = '',
+    ) -> None:
+        self._create_char = create_char
+        self._catalog = catalog
+        self._free = list(range(slots))
+        self._loaded: OrderedDict[str, int] = OrderedDict()  # glyph -> slot, LRU first
+        self._pending: dict[int, list[int]] = {}  # slot -> bitmap, not written yet
+        self._glyph_chars = frozenset(catalog)
+        self._table: dict[int, str] = {
+            ord(char): glyph.fallback for char, glyph in catalog.items()
+        }
+        self._lock = threading.Lock()
+        self.epoch = 0
+        self._state = state
+        self._state_key = state_key
+
+        if state is not None:
+            for char, slot in sorted(
+                state.slots(state_key, catalog).items(), key=lambda item: item[1]
+            ):
+                if slot in self._free:
+                    self._free.remove(slot)
+                    self._loaded[char] = slot
+                    self._table[ord(char)] = chr(slot)
+            if self._loaded:
+                logger.debug(f'Glyphs already in CGRAM: {"".join(self._loaded)}')
+
+    def _assign(self, char: str, needed: frozenset[str]) -> bool:
+        if self._free:
+            slot = self._free.pop(0)
+        else:
+            victim = next((c for c in self._loaded if c not in needed), None)
+            if victim is None:
+                return False
+            slot = self._loaded.pop(victim)
+            self._table[ord(victim)] = self._catalog[victim].fallback
+
+        self._loaded[char] = slot
+        self._table[ord(char)] = chr(slot)
+        self._pending[slot] = self._catalog[char].bitmap
+        self.epoch += 1
+        return True
+
+    def prepare(self, texts: list[str]) -> tuple[list[str], int]:
+        """
+        Translates texts that will be shown one after another (like a rotation) with
+        all of their glyphs loaded together, and returns them with the epoch they
+        are valid for.
+        """
+        joined = '\n'.join(texts)
+        needed = self._glyph_chars.intersection(joined)
+        with self._lock:
+            # assign in order of appearance, so slots don't depend on set order
+            for char in sorted(needed, key=joined.index):
+                if char in self._loaded:
+                    self._loaded.move_to_end(char)
+                elif not self._assign(char, needed):
+                    logger.warning(
+                        f'No free CGRAM slot for {char}, showing {self._catalog[char].fallback!r}'
+                    )
+            return [text.translate(self._table) for text in texts], self.epoch
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            loaded = dict(self._loaded)
+        if not pending:
+            return
+
+        if self._state is not None:
+            # forget the slots first, a slot that was half written isn't loaded
+            self._state.update(
+                self._state_key,
+                {char: slot for char, slot in loaded.items() if slot not in pending},
+                self._catalog,
+            )
+        for slot, bitmap in pending.items():
+            logger.debug(f'Loading glyph into CGRAM slot {slot}')
+            self._create_char(slot, bitmap)
+        if self._state is not None:
+            self._state.update(self._state_key, loaded, self._catalog)
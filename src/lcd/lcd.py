@@ -1,75 +1,75 @@
-from time import sleep
-
-import board  # type: ignore
-from digitalio import DigitalInOut  # type: ignore
-from adafruit_character_lcd.character_lcd import Character_LCD_Mono  # type: ignore
-
 import logging
+from typing import Any, Optional
 
-from src.types import Pins
+from src.lcd.character import CharacterLCD
+from src.lcd.glyphs import CgramState
+from src.types import BusConfig, Pins
 
 logger = logging.getLogger(__name__)
 
 
+# board pin names, only looked up by _pin() when the displays are set up, so that
+# importing this doesn't run Blinka's platform detection in front of startup
 PINS: Pins = {
-    'rs': board.D5,  # LCD pin 4
-    'd4': board.D6,  # LCD pin 11
-    'd5': board.D13,  # LCD pin 12
-    'd6': board.D19,  # LCD pin 13
-    'd7': board.D26,  # LCD pin 14
-    'en': [board.D16, board.D20, board.D21],  # LCD pin 6
-}
-
-# https://www.quinapalus.com/hd44780udg.html
-_CUSTOM_CHARS = {
-    '°': [4, 10, 4, 0, 0, 0, 0, 0],
-    '≈': [0, 8, 21, 2, 8, 21, 2, 0],
-    '≋': [8, 21, 2, 8, 21, 2, 24, 7],
-    '⸪': [18, 18, 9, 9, 18, 18, 9, 9],
-    '☁': [10, 21, 31, 0, 0, 0, 0, 0],
-    '🌧': [10, 21, 31, 0, 4, 21, 21, 17],
-    '☼': [4, 21, 14, 27, 14, 21, 4, 0],
-    '~': [0, 0, 8, 21, 2, 0, 0, 0],
+    'rs': 'D5',  # LCD pin 4
+    'd4': 'D6',  # LCD pin 11
+    'd5': 'D13',  # LCD pin 12
+    'd6': 'D19',  # LCD pin 13
+    'd7': 'D26',  # LCD pin 14
+    'en': ['D16', 'D20', 'D21'],  # LCD pin 6
 }
 
-
-_CHAR_MAP = {char: chr(idx) for idx, char in enumerate(_CUSTOM_CHARS)}
-
-
-def _translate_text(text: str) -> str:
-    for idx, (key, _) in enumerate(_CHAR_MAP.items()):
-        text = text.replace(key, chr(idx))
-    return text
-
-
-class LCD:
-    def __init__(self, en, width, height, rs, d4, d5, d6, d7):
-        self.lcd = Character_LCD_Mono(
-            DigitalInOut(rs),
-            DigitalInOut(en),
-            DigitalInOut(d4),
-            DigitalInOut(d5),
-            DigitalInOut(d6),
-            DigitalInOut(d7),
-            width,
-            height,
+BUSES: list[BusConfig] = [
+    {
+        'name': 'gpio',
+        'pins': {
+            'rs': PINS['rs'],
+            'd4': PINS['d4'],
+            'd5': PINS['d5'],
+            'd6': PINS['d6'],
+            'd7': PINS['d7'],
+        },
+        'displays': [{'en': en, 'width': 16, 'height': 2} for en in PINS['en']],
+    }
+]
+
+
+def _pin(pin: Any) -> Any:
+    # pins are names like 'D16', or board pins passed in directly
+    if not isinstance(pin, str):
+        return pin
+    import board  # type: ignore
+
+    return getattr(board, pin)
+
+
+class LCD(CharacterLCD):
+    """
+    An HD44780 character LCD wired straight to GPIO pins, driven by Adafruit's
+    Character_LCD_Mono.
+    """
+
+    def __init__(
+        self,
+        en,
+        width,
+        height,
+        rs,
+        d4,
+        d5,
+        d6,
+        d7,
+        cgram_state: Optional[CgramState] = None,
+    ):
+        self._pins = (rs, en, d4, d5, d6, d7)
+        super().__init__(str(en), width, height, cgram_state)
+
+    def _create_driver(self) -> Any:
+        from digitalio import DigitalInOut  # type: ignore
+        from adafruit_character_lcd import character_lcd  # type: ignore
+
+        return character_lcd.Character_LCD_Mono(
+            *(DigitalInOut(_pin(pin)) for pin in self._pins),
+            self.width,
+            self.height,
         )
-        self._init_custom_chars()
-        self.text = ''
-        self.width = width
-        self.height = height
-
-    def _init_custom_chars(self):
-        for idx, (symbol, bitmap) in enumerate(_CUSTOM_CHARS.items()):
-            logger.debug(f'Adding custom char: {idx} {symbol} {bitmap}')
-            self.lcd.create_char(idx, bitmap)
-            sleep(0.05)
-        sleep(0.05)
-
-    def set_text(self, text: str):
-        self.lcd.message = _translate_text(text)
-        self.text = text
-
-    def clear(self):
-        self.lcd.clear()
-        self.text = ''
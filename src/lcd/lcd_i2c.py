@@ -0,0 +1,310 @@
+"""
+HD44780 character LCDs behind PCF8574 I2C backpacks, so a whole wall of displays
+only needs the two I2C pins.
+
+The backpack is an 8-bit port expander: every byte written to it sets its 8
+outputs, wired to RS, RW, E, the backlight and D4-D7. One 4-bit transfer to the
+LCD is two bytes (E high, then E low to latch), so a character is four bytes.
+Writing those one expander write at a time, as generic drivers do, costs an I2C
+transaction (address, ack, stop) per pin change; this driver instead queues a
+whole frame's bytes, glyph uploads included, and sends them in one bulk write.
+The bus clock paces the bytes: at up to 400kHz each byte takes longer than the
+LCD's enable pulse and command times, except clear and the init sequence,
+which are flushed and waited for separately.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Optional
+
+from src.lcd.character import CharacterLCD
+from src.lcd.glyphs import CgramState
+from src.types import Frame
+
+logger = logging.getLogger(__name__)
+
+# PCF8574 outputs, in the usual backpack wiring. P4-P7 are D4-D7
+RS = 0x01
+RW = 0x02  # kept low, the LCD is only ever written
+EN = 0x04
+BACKLIGHT = 0x08
+
+# HD44780 instructions
+_CLEAR = 0x01
+_ENTRY_MODE = 0x06  # move right, don't shift the display
+_DISPLAY_ON = 0x0C  # no cursor, no blink
+_FUNCTION_4BIT = 0x20
+_TWO_LINES = 0x08
+_SET_CGRAM = 0x40
+_SET_DDRAM = 0x80
+
+MAX_WRITE = 4096  # bytes per I2C transaction, well under Linux's 8192 limit
+DEFAULT_ADDRESS = 0x27
+
+
+def row_offsets(columns: int) -> tuple[int, int, int, int]:
+    # DDRAM address of each row: rows 2 and 3 continue rows 0 and 1
+    return (0x00, 0x40, columns, 0x40 + columns)
+
+
+class Pcf8574Driver:
+    """
+    The part of Character_LCD_Mono's interface the LCD class uses (cursor_position,
+    message, create_char, clear), over a PCF8574. Writes are only queued, flush()
+    sends everything queued since the last one as one I2C write.
+    """
+
+    def __init__(
+        self,
+        i2c: Any,
+        address: int,
+        columns: int,
+        lines: int,
+        backlight: bool = True,
+    ) -> None:
+        self.i2c = i2c
+        self.address = address
+        self.columns = columns
+        self.lines = lines
+        self._backlight = BACKLIGHT if backlight else 0
+        self._offsets = row_offsets(columns)
+        self._buffer = bytearray()
+        self._rs: Optional[int] = None  # RS level of the last byte queued
+        self._init()
+
+    def _nibble(self, value: int, rs: int) -> None:
+        bits = (value & 0x0F) << 4 | rs | self._backlight
+        if rs != self._rs:
+            # RS has to be stable before E rises, so it gets a byte of its own
+            self._buffer.append(bits)
+            self._rs = rs
+        self._buffer += bytes((bits | EN, bits))
+
+    def _command(self, value: int) -> None:
+        self._nibble(value >> 4, 0)
+        self._nibble(value, 0)
+
+    def _data(self, value: int) -> None:
+        self._nibble(value >> 4, RS)
+        self._nibble(value, RS)
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        data, self._buffer = bytes(self._buffer), bytearray()
+        while not self.i2c.try_lock():
+            pass
+        try:
+            for start in range(0, len(data), MAX_WRITE):
+                self.i2c.writeto(self.address, data[start : start + MAX_WRITE])
+        finally:
+            self.i2c.unlock()
+
+    def _init(self) -> None:
+        # "initializing by instruction" from the datasheet: the LCD may be in 8 or
+        # 4-bit mode, three 8-bit function sets get it to a known state first
+        time.sleep(0.05)
+        for delay in (0.0045, 0.00015, 0.00015):
+            self._nibble(0x3, 0)
+            self.flush()
+            time.sleep(delay)
+        self._nibble(0x2, 0)
+        self._command(_FUNCTION_4BIT | (_TWO_LINES if self.lines > 1 else 0))
+        self._command(_DISPLAY_ON)
+        self._command(_ENTRY_MODE)
+        self.clear()
+
+    def clear(self) -> None:
+        self._command(_CLEAR)
+        self.flush()
+        time.sleep(0.002)  # 1.52ms to clear
+
+    def cursor_position(self, column: int, row: int) -> None:
+        self._command(_SET_DDRAM | (self._offsets[row] + column))
+
+    def create_char(self, location: int, pattern: list[int]) -> None:
+        self._command(_SET_CGRAM | (location & 0x07) << 3)
+        for row in pattern[:8]:
+            self._data(row)
+
+    def write(self, text: str) -> None:
+        row = 0
+        for char in text:
+            if char == '\n':
+                row += 1
+                self.cursor_position(0, row)
+            else:
+                self._data(ord(char) & 0xFF)
+
+    # Character_LCD_Mono writes text by assigning it to message
+    message = property(None, write)
+
+
+_buses: dict[tuple[Any, Any], Any] = {}
+_buses_lock = threading.Lock()
+
+
+def get_i2c(scl: Any = 'SCL', sda: Any = 'SDA') -> Any:
+    """One busio.I2C per pair of pins, shared by every backpack on it."""
+    key = (scl, sda)
+    with _buses_lock:
+        if key not in _buses:
+            import board  # type: ignore
+            import busio  # type: ignore
+
+            # pins from a displays file are names like 'SCL'
+            scl, sda = (getattr(board, p) if isinstance(p, str) else p for p in key)
+            _buses[key] = busio.I2C(scl, sda)
+        return _buses[key]
+
+
+class LCD(CharacterLCD):
+    """
+    An LCD behind a PCF8574 backpack at address. Frames are diffed like on GPIO,
+    and each show() is one bulk I2C write. i2c replaces the busio bus, e.g. with
+    a FakeExpander, which needs no hardware or Blinka at all.
+    """
+
+    def __init__(
+        self,
+        address: int = DEFAULT_ADDRESS,
+        width: int = 16,
+        height: int = 2,
+        scl: Any = 'SCL',
+        sda: Any = 'SDA',
+        cgram_state: Optional[CgramState] = None,
+        i2c: Any = None,
+    ):
+        self.address = address
+        self._bus = (scl, sda)
+        self._i2c = i2c
+        # the name keys the saved CGRAM slots, and backpacks on separate buses can
+        # share an address
+        super().__init__(f'i2c-{scl}-{sda}-{address:#04x}', width, height, cgram_state)
+
+    def _create_driver(self) -> Pcf8574Driver:
+        i2c = self._i2c if self._i2c is not None else get_i2c(*self._bus)
+        return Pcf8574Driver(i2c, self.address, self.width, self.height)
+
+    def show(self, frame: Frame) -> bool:
+        try:
+            return super().show(frame)
+        finally:
+            if self.lcd is not None:
+                self.lcd.flush()
+
+
+class FakeHd44780:
+    """
+    What an HD44780 makes of the bytes written to its backpack: latches a nibble
+    on every falling edge of E, pairs nibbles once in 4-bit mode, and keeps its
+    DDRAM and CGRAM. setup_violations counts E rising in the same byte RS changed.
+    """
+
+    def __init__(self, columns: int = 16, lines: int = 2) -> None:
+        self.columns = columns
+        self.lines = lines
+        self.ddram = bytearray(b' ' * 128)
+        self.cgram = bytearray(64)
+        self.display_on = False
+        self.four_bit = False
+        self.setup_violations = 0
+        self._address = 0
+        self._in_cgram = False
+        self._half: Optional[int] = None  # first nibble of a 4-bit transfer
+        self._last = 0  # the previous byte on the expander
+
+    def feed(self, data: bytes) -> None:
+        for byte in data:
+            if byte & EN and not self._last & EN and (byte ^ self._last) & RS:
+                self.setup_violations += 1
+            if self._last & EN and not byte & EN:
+                self._latch(byte >> 4, bool(byte & RS))
+            self._last = byte
+
+    def _latch(self, nibble: int, rs: bool) -> None:
+        if not self.four_bit:
+            # 8-bit mode, D0-D3 aren't connected and read as 0
+            self._execute(nibble << 4, rs)
+        elif self._half is None:
+            self._half = nibble
+        else:
+            value, self._half = self._half << 4 | nibble, None
+            self._execute(value, rs)
+
+    def _execute(self, value: int, rs: bool) -> None:
+        if rs:
+            if self._in_cgram:
+                self.cgram[self._address & 0x3F] = value
+            else:
+                self.ddram[self._address & 0x7F] = value
+            self._address += 1
+        # instructions are told apart by their highest set bit
+        elif value & _SET_DDRAM:
+            self._in_cgram = False
+            self._address = value & 0x7F
+        elif value & _SET_CGRAM:
+            self._in_cgram = True
+            self._address = value & 0x3F
+        elif value & _FUNCTION_4BIT:
+            self.four_bit = not value & 0x10
+            self._half = None
+        elif value & 0x10:
+            pass  # cursor or display shift, never sent
+        elif value & 0x08:
+            self.display_on = bool(value & 0x04)
+        elif value & 0x04:
+            pass  # entry mode, always _ENTRY_MODE
+        elif value & 0x02:
+            self._address = 0
+            self._in_cgram = False
+        elif value == _CLEAR:
+            self.ddram[:] = b' ' * 128
+            self._address = 0
+            self._in_cgram = False
+
+    def screen(self) -> list[str]:
+        return [
+            self.ddram[offset : offset + self.columns].decode('latin-1')
+            for offset in row_offsets(self.columns)[: self.lines]
+        ]
+
+    def glyph(self, slot: int) -> list[int]:
+        return list(self.cgram[slot * 8 : slot * 8 + 8])
+
+
+class FakeExpander:
+    """
+    In-process stand-in for busio.I2C with PCF8574 backpacks on it, for trying the
+    driver without hardware. Records every transaction as (address, bytes), and
+    with decode (the default) runs them through a FakeHd44780 per address.
+    """
+
+    def __init__(self, columns: int = 16, lines: int = 2, decode: bool = True) -> None:
+        self.columns = columns
+        self.lines = lines
+        self.decode = decode
+        self.transactions: list[tuple[int, bytes]] = []
+        self.displays: dict[int, FakeHd44780] = {}
+
+    def try_lock(self) -> bool:
+        return True
+
+    def unlock(self) -> None:
+        pass
+
+    def writeto(self, address: int, buffer: bytes) -> None:
+        self.transactions.append((address, bytes(buffer)))
+        if self.decode:
+            if address not in self.displays:
+                self.displays[address] = FakeHd44780(self.columns, self.lines)
+            self.displays[address].feed(buffer)
+
+    def bus_seconds(self, frequency: float = 100_000) -> float:
+        """
+        How long the recorded transactions would keep a real bus busy: 9 clocks
+        per byte (8 bits and the ack) plus the address byte, start and stop.
+        """
+        clocks = sum((len(data) + 1) * 9 + 2 for _, data in self.transactions)
+        return clocks / frequency
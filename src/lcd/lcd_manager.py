@@ -1,89 +1,208 @@
-import threading
-from time import sleep
-from typing import TypedDict
-from src.lcd import get_lcd_class
-from src.types import RotatingPart
-from src.utils import RotatingDisplayThread, justify_text_parts, print_lcds
+import time
+from typing import Optional
+from src import metrics
+from src.lcd import get_default_buses, get_lcd_class
+from src.lcd.bus import BusWriter
+from src.lcd.glyphs import CgramState
+from src.lcd.terminal import FrameFileRenderer, Renderer, TerminalRenderer
+from src.startup import PROFILE
+from src.types import BusConfig, CompiledPart, Frame, RotatingPart
+from src.utils import DisplayScheduler, justify_text_parts
 
 
-class DisplayThread(TypedDict):
-    thread: threading.Thread
-    lcd: int
+PAGES_COMPILED = metrics.counter(
+    'kitchenpi_pages_compiled_total',
+    'Rotation pages compiled because they were new or had changed',
+)
+ROTATIONS_UNCHANGED = metrics.counter(
+    'kitchenpi_rotations_unchanged_total',
+    'Rotation updates skipped because every page was the same',
+)
+
+INIT_GAP = 0.1  # seconds between initializing the LCDs on one bus
+
+PageKey = tuple[tuple[tuple[str, ...], ...], float]
+
+
+def _page_key(part: RotatingPart) -> PageKey:
+    return tuple(tuple(line) for line in part['lines_and_parts']), part['duration']
 
 
 class LcdManager:
-    def __init__(self, is_dev: bool) -> None:
+    """
+    Owns every LCD, numbered across all the buses in order. Each bus has its own
+    BusWriter thread, so adding a bus adds displays without slowing the others
+    down; LCDs on the same bus share its pins and are written one at a time.
+    """
+
+    def __init__(
+        self,
+        is_dev: bool,
+        frames_file: Optional[str] = None,
+        fps: float = 10,
+        cgram_file: Optional[str] = None,
+        buses: Optional[list[BusConfig]] = None,
+    ) -> None:
         self.is_dev = is_dev
-        LCD, PINS = get_lcd_class(is_dev)
-
-        self.lcds = [];
-        num_screens = len(PINS['en']);
-        for index, en_pin in enumerate(PINS['en']):
-            lcd = LCD(
-                en=en_pin,
-                width=16,
-                height=2,
-                rs=PINS['rs'],
-                d4=PINS['d4'],
-                d5=PINS['d5'],
-                d6=PINS['d6'],
-                d7=PINS['d7'],
+        self.buses = buses or get_default_buses(is_dev)
+        cgram_state = CgramState(cgram_file) if cgram_file and not is_dev else None
+
+        # the hardware is initialized by the bus writers once they start
+        self.lcds = []
+        bus_lcds = []
+        for bus in self.buses:
+            LCD = get_lcd_class(is_dev, bus.get('driver', 'gpio'))
+            lcds = [
+                LCD(**display, **bus.get('pins', {}), cgram_state=cgram_state)
+                for display in bus['displays']
+            ]
+            bus_lcds.append(lcds)
+            self.lcds += lcds
+
+        # in dev mode the mock LCDs are shown in the terminal, or recorded with
+        # frames_file, by a renderer that only redraws what changed
+        self.renderer: Optional[Renderer] = None
+        if is_dev:
+            self.renderer = (
+                FrameFileRenderer(self.lcds, frames_file, fps)
+                if frames_file
+                else TerminalRenderer(self.lcds, fps)
+            )
+            self.renderer.start()
+
+        # every write goes through its bus's writer, the only thread using its pins
+        self.writers: list[BusWriter] = []
+        self._routes: list[tuple[BusWriter, int]] = []  # lcd -> (writer, bus index)
+        for bus, lcds in zip(self.buses, bus_lcds):
+            writer = BusWriter(
+                lcds,
+                on_write=self._on_write,
+                name=f'lcd-bus-{bus["name"]}',
+                offset=len(self._routes),
+                init_gap=0 if is_dev else INIT_GAP,
             )
-            if index < num_screens - 1:
-                sleep(0.1)
+            self.writers.append(writer)
+            self._routes += [(writer, index) for index in range(len(lcds))]
+            writer.start()
 
-            self.lcds.append(lcd)
+        self.scheduler = DisplayScheduler(self)
+        self.scheduler.start()
 
-        self.rotating_display_threads: dict[int, RotatingDisplayThread] = {}
+        # per LCD, the pages of its current rotation along with their compiled parts
+        self._pages: dict[int, list[tuple[PageKey, CompiledPart]]] = {}
 
-        self.threads: list[DisplayThread] = []
+    def _on_write(self, lcd_index: int) -> None:
+        PROFILE.mark('first frame on screen')
+        if self.renderer:
+            self.renderer.mark_dirty(lcd_index)
+
+    def show_splash(self, lines_and_parts: list[list[str]]) -> None:
+        for lcd_index in range(len(self.lcds)):
+            self.set_text_parts(lcd_index, lines_and_parts)
 
     def clear_all(self) -> None:
         for idx, _ in enumerate(self.lcds):
             self.clear(idx)
-        self._print()
 
     def clear(self, lcd_index: int) -> None:
-        self.lcds[lcd_index].clear()
-        self._print()
+        # stops the LCD's rotation too, so the scheduler doesn't redraw over it
+        if self._pages.pop(lcd_index, None) is not None:
+            self.scheduler.set_rotation(lcd_index, [])
+        self.set_text(lcd_index, '')
 
-    def set_text(self, lcd_index: int, text: str, print_dev: bool = True) -> None:
-        self.clear(lcd_index)
-        self.lcds[lcd_index].set_text(text)
-        if print_dev:
-            self._print()
+    def set_text(self, lcd_index: int, text: str) -> None:
+        # the LCD diffs against what it's showing, so there's no need to clear first
+        self.show_frame(lcd_index, self.lcds[lcd_index].compile_frames([text])[0])
 
     # array is array of lines, each is an array of parts.
     # set 1, 2, or 3 parts per line, array is array of lines
     # parts will be justified as best as possible
     # ex: with width = 16, set_text_parts([['abc', 'xyz']]) adds middle padding and results in 'abc          xyz'
     # set_text_parts([['abc', 'qwe', 'xyz']]) centers the second part and right-justifies the third: 'abc   qwe    xyz'
-    def set_text_parts(
-        self, lcd_index: int, lines_and_parts: list[list[str]], print_dev: bool = True
-    ) -> None:
-        text = '\n'.join(
+    def set_text_parts(self, lcd_index: int, lines_and_parts: list[list[str]]) -> None:
+        self.set_text(lcd_index, self._justify(lcd_index, lines_and_parts))
+
+    def _justify(self, lcd_index: int, lines_and_parts: list[list[str]]) -> str:
+        return '\n'.join(
             map(
                 lambda parts: justify_text_parts(parts, self.lcds[lcd_index].width),
                 lines_and_parts,
             )
         )
-        self.set_text(lcd_index, text, print_dev=print_dev)
+
+    def show_frame(self, lcd_index: int, frame: Frame) -> None:
+        # never blocks, the bus writer keeps only the newest frame per LCD
+        writer, bus_index = self._routes[lcd_index]
+        writer.submit(bus_index, frame)
+
+    # justifies and glyph-translates every part of a rotation up front, so the
+    # scheduler only has to push the precompiled frames when each one is due
+    def compile_rotation(
+        self, lcd_index: int, rotation: list[RotatingPart]
+    ) -> list[CompiledPart]:
+        frames = self.lcds[lcd_index].compile_frames(
+            [self._justify(lcd_index, part['lines_and_parts']) for part in rotation]
+        )
+        return [
+            CompiledPart(frame, part['duration'])
+            for frame, part in zip(frames, rotation)
+        ]
 
     def set_rotating_text_parts(
         self, lcd_index: int, rotation: list[RotatingPart]
     ) -> None:
-        if lcd_index in self.rotating_display_threads:
-            self.rotating_display_threads[lcd_index].set_rotation(rotation)
-        else:
-            thread = RotatingDisplayThread(
-                rotation=rotation, lcd_manager=self, lcd_index=lcd_index
-            )
-            self.rotating_display_threads[lcd_index] = thread
-            thread.start()
+        """
+        Diffs the rotation against the LCD's current one page by page: only pages
+        that weren't there before are compiled, and an identical rotation doesn't
+        touch the scheduler at all. The scheduler keeps its place either way.
+
+        If compiling moved the LCD's glyphs around, the pages kept from before
+        were translated for the old CGRAM slots, so then the whole rotation is
+        compiled again, with all of its glyphs loaded together. Otherwise the bus
+        writer would have to recompile those pages every time they're shown.
+        """
+        lcd = self.lcds[lcd_index]
+        keys = [_page_key(part) for part in rotation]
+        previous = self._pages.get(lcd_index, [])
+        if keys == [key for key, _ in previous] and all(
+            part.frame.glyph_epoch == lcd.glyph_epoch for _, part in previous
+        ):
+            ROTATIONS_UNCHANGED.inc()
+            return
 
-    def _print(self) -> None:
-        if self.is_dev:
-            print_lcds(self.lcds)
+        compiled = dict(previous)
+        new_parts = {
+            key: part for key, part in zip(keys, rotation) if key not in compiled
+        }
+        compiled.update(
+            zip(new_parts, self.compile_rotation(lcd_index, list(new_parts.values())))
+        )
+        PAGES_COMPILED.inc(len(new_parts))
+
+        if any(compiled[key].frame.glyph_epoch != lcd.glyph_epoch for key in keys):
+            compiled = dict(zip(keys, self.compile_rotation(lcd_index, rotation)))
+            PAGES_COMPILED.inc(len(rotation))
+
+        pages = [(key, compiled[key]) for key in keys]
+        self._pages[lcd_index] = pages
+        self.scheduler.set_rotation(lcd_index, [part for _, part in pages])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return all(
+            writer.flush(
+                None if deadline is None else max(0.0, deadline - time.monotonic())
+            )
+            for writer in self.writers
+        )
 
-    def print_all(self) -> None:
-        print_lcds(self.lcds)
+    def stop(self) -> None:
+        self.scheduler.stop()
+        self.scheduler.join()
+        for writer in self.writers:
+            writer.stop()
+        for writer in self.writers:
+            writer.join()
+        if self.renderer:
+            self.renderer.stop()
+            self.renderer.join()
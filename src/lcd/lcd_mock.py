@@ -1,4 +1,5 @@
-from src.types import Pins
+from src.types import BusConfig, Frame, Pins
+from src.utils import frame_lines
 
 PINS: Pins = {
     'rs': 26,
@@ -6,18 +7,56 @@ PINS: Pins = {
     'd5': 6,
     'd6': 5,
     'd7': 12,
-    'en': [15],
+    'en': [15, 16, 17],  # same number of screens as the real bus
 }
 
+BUSES: list[BusConfig] = [
+    {
+        'name': 'gpio',
+        'pins': {
+            'rs': PINS['rs'],
+            'd4': PINS['d4'],
+            'd5': PINS['d5'],
+            'd6': PINS['d6'],
+            'd7': PINS['d7'],
+        },
+        'displays': [{'en': en, 'width': 16, 'height': 2} for en in PINS['en']],
+    }
+]
+
 
 class LCD:
-    def __init__(self, en: int, width=16, height=2, rs=1, d4=2, d5=3, d6=4, d7=5):
+    # pins (en, rs, address, ...) are accepted for any driver and ignored
+    def __init__(self, width=16, height=2, cgram_state=None, **pins):
         self.text = ''
         self.width = width
         self.height = height
+        self.digest = hash('')
+
+    def begin(self) -> None:
+        pass
+
+    @property
+    def glyph_epoch(self) -> int:
+        return 0  # no glyphs, frames never need compiling again
+
+    def compile_frames(self, texts: list[str]) -> list[Frame]:
+        frames = []
+        for text in texts:
+            data = ''.join(frame_lines(text, self.width, self.height)).encode('utf-8')
+            frames.append(Frame(text, data, hash(data), 0))
+        return frames
+
+    def show(self, frame: Frame) -> bool:
+        if frame.digest == self.digest:
+            return False
+        self.text = frame.text
+        self.digest = frame.digest
+        return True
 
     def set_text(self, text: str):
-        self.text = text
+        self.show(self.compile_frames([text])[0])
 
     def clear(self):
         self.text = ''
+        self.digest = hash('')
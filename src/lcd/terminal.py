@@ -0,0 +1,204 @@
+import json
+import logging
+import shutil
+import sys
+import threading
+import time
+import traceback
+import unicodedata
+from abc import ABCMeta, abstractmethod
+from typing import Any, Optional, Sequence, TextIO
+
+from src import metrics
+from src.utils import changed_runs, frame_lines
+
+
+logger = logging.getLogger(__name__)
+
+RENDER_SECONDS = metrics.histogram(
+    'kitchenpi_dev_render_seconds', 'Time to render changed LCDs in dev mode'
+)
+
+_GAP = 2  # columns between LCD boxes
+
+
+def _has_wide(text: str) -> bool:
+    # emoji and CJK take two terminal columns
+    return any(
+        ord(char) >= 0x1F000 or unicodedata.east_asian_width(char) in 'WF'
+        for char in text
+    )
+
+
+class Renderer(threading.Thread, metaclass=ABCMeta):
+    """
+    Shows what the (mock) LCDs display from one thread, at most fps times a
+    second. mark_dirty() only flags an LCD, so writers never wait on the output,
+    and an LCD that changes several times between frames is rendered once.
+    """
+
+    def __init__(
+        self, lcds: Sequence[Any], fps: float = 10, name: str = 'renderer'
+    ) -> None:
+        super().__init__(daemon=True, name=name)
+        self.lcds = lcds
+        self.interval = 1 / fps
+        self._dirty: set[int] = set()
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def mark_dirty(self, lcd_index: int) -> None:
+        with self._condition:
+            self._dirty.add(lcd_index)
+            self._condition.notify()
+
+    @abstractmethod
+    def render(self, lines: dict[int, list[str]]) -> None: ...
+
+    def close(self) -> None:
+        pass
+
+    def run(self):
+        last = 0.0
+        while True:
+            with self._condition:
+                while not self._stopped and not self._dirty:
+                    self._condition.wait()
+                if self._stopped:
+                    break
+            # cap the frame rate, and let more changes pile up in the meantime
+            wait = last + self.interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            with self._condition:
+                dirty, self._dirty = self._dirty, set()
+            last = time.monotonic()
+            try:
+                with RENDER_SECONDS.time():
+                    self.render(
+                        {
+                            index: frame_lines(
+                                self.lcds[index].text,
+                                self.lcds[index].width,
+                                self.lcds[index].height,
+                            )
+                            for index in sorted(dirty)
+                        }
+                    )
+            except Exception as e:
+                logger.error(f'Failed to render LCDs: {e}')
+                logger.debug(traceback.format_exc())
+        self.close()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+
+class TerminalRenderer(Renderer):
+    """
+    Draws the LCDs as boxes at the top of the terminal and then only rewrites
+    the characters that changed, using ANSI escapes. Everything below the boxes
+    is a scroll region, so log output still scrolls underneath them.
+    """
+
+    def __init__(
+        self,
+        lcds: Sequence[Any],
+        fps: float = 10,
+        out: TextIO = sys.stdout,
+        columns: Optional[int] = None,
+    ) -> None:
+        super().__init__(lcds, fps, name='terminal-renderer')
+        self.out = out
+        self.columns = columns or shutil.get_terminal_size().columns
+        self._shown: dict[int, list[str]] = {}
+        self._positions = self._layout()
+
+    def _layout(self) -> list[tuple[int, int]]:
+        # 1-based (row, column) of each box's top left corner, wrapped to the terminal
+        box_width = max(lcd.width for lcd in self.lcds) + 2
+        box_height = max(lcd.height for lcd in self.lcds) + 2
+        per_row = max(1, (self.columns + _GAP) // (box_width + _GAP))
+        return [
+            (
+                1 + (index // per_row) * box_height,
+                1 + (index % per_row) * (box_width + _GAP),
+            )
+            for index in range(len(self.lcds))
+        ]
+
+    def _draw_boxes(self) -> str:
+        height = max(
+            row + lcd.height + 1 for (row, _), lcd in zip(self._positions, self.lcds)
+        )
+        output = ['\x1b[?25l\x1b[2J']  # hide the cursor, clear the screen
+        for (row, column), lcd in zip(self._positions, self.lcds):
+            output.append(f'\x1b[{row};{column}H┌{"─" * lcd.width}┐')
+            for line in range(lcd.height):
+                output.append(f'\x1b[{row + 1 + line};{column}H│{" " * lcd.width}│')
+            output.append(f'\x1b[{row + lcd.height + 1};{column}H└{"─" * lcd.width}┘')
+        # logs scroll below the boxes
+        output.append(f'\x1b[{height + 1}r\x1b[{height + 1};1H')
+        for index, lcd in enumerate(self.lcds):
+            self._shown[index] = [' ' * lcd.width] * lcd.height
+        return ''.join(output)
+
+    def render(self, lines: dict[int, list[str]]) -> None:
+        output = [] if self._shown else [self._draw_boxes()]
+        output.append('\x1b7')  # save the cursor, it belongs to the log output
+        for index, new_lines in lines.items():
+            row, column = self._positions[index]
+            width = self.lcds[index].width
+            for line, (old, new) in enumerate(zip(self._shown[index], new_lines)):
+                if old == new:
+                    continue
+                if _has_wide(old) or _has_wide(new):
+                    # character offsets aren't terminal columns any more, so
+                    # rewrite the line and put back the border it may have pushed
+                    output.append(
+                        f'\x1b[{row + 1 + line};{column + 1}H{new}'
+                        f'\x1b[{row + 1 + line};{column + 1 + width}H│'
+                    )
+                    continue
+                for start, end in changed_runs(old, new, max_gap=2):
+                    position = f'{row + 1 + line};{column + 1 + start}'
+                    output.append(f'\x1b[{position}H{new[start:end]}')
+            self._shown[index] = new_lines
+        output.append('\x1b8')
+        self.out.write(''.join(output))
+        self.out.flush()
+
+    def close(self) -> None:
+        if self._shown:
+            # give the whole screen back to the terminal, and show the cursor again
+            self.out.write('\x1b7\x1b[r\x1b8\x1b[?25h')
+            self.out.flush()
+
+
+class FrameFileRenderer(Renderer):
+    """
+    Headless: appends each rendered LCD to a JSON-lines file instead, as
+    {"t": seconds since start, "lcd": index, "lines": [...]}.
+    """
+
+    def __init__(self, lcds: Sequence[Any], path: str, fps: float = 10) -> None:
+        super().__init__(lcds, fps, name='frame-file-renderer')
+        self.path = path
+        self._file = open(path, 'a')
+        self._start = time.monotonic()
+
+    def render(self, lines: dict[int, list[str]]) -> None:
+        elapsed = round(time.monotonic() - self._start, 3)
+        self._file.write(
+            ''.join(
+                json.dumps({'t': elapsed, 'lcd': index, 'lines': new_lines}) + '\n'
+                for index, new_lines in lines.items()
+            )
+        )
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
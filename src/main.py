@@ -1,14 +1,32 @@
+# first, so the startup profile's clock starts before the other imports
+from src.startup import PROFILE
+
 import argparse
 import logging
+import os
+import signal
 import sys
+import threading
 import time
-import traceback
+from typing import Callable, Optional, Sequence
 
+from src.lcd import load_buses
 from src.lcd.lcd_manager import LcdManager
 
-from src.types import CurrentWeather, DailyWeather, HourlyWeather, Weather
+from src.types import (
+    CurrentWeather,
+    DailyWeather,
+    HourlyWeather,
+    RotatingPart,
+    Weather,
+    WeatherByLocation,
+)
 import src.utils as utils
+from src import metrics
+from src.pipeline import FetchSchedule, WeatherChannel, WeatherProducer
 from src.weather import open_meteo
+from src.weather.cache import DEFAULT_CACHE_DIR, ForecastCache
+from src.weather.capture import DEFAULT_CAPTURE_SIZE, PayloadRing
 
 
 logger = logging.getLogger(__name__)
@@ -17,6 +35,11 @@ LOCATIONS = {
     'Minneapolis': {'lat': 44.9778, 'lon': -93.2650},
     'Seattle': {'lat': 47.6062, 'lon': -122.3321},
 }
+ALL_LOCATIONS = 'all'
+
+CURRENT_INTERVAL_SECONDS = 15 * 60  # how often Open-Meteo's current conditions move
+
+SPLASH = [['', 'kitchenpi', ''], ['', 'Getting weather', '']]
 
 
 def parse_args():
@@ -26,6 +49,18 @@ def parse_args():
         action='store_true',
         help='Run in development mode (no LCD, just print to console, no log file)',
     )
+    parser.add_argument(
+        '--dev-frames',
+        type=str,
+        default=None,
+        help='In development mode, record the LCD frames to this file (JSON lines) instead of drawing them',
+    )
+    parser.add_argument(
+        '--dev-fps',
+        type=float,
+        default=10,
+        help='How many times a second development mode redraws the LCDs at most. Default is 10',
+    )
     parser.add_argument(
         '--log-level',
         choices=['debug', 'info', 'error', 'off'],
@@ -42,14 +77,96 @@ def parse_args():
         '--refresh-interval',
         type=int,
         default=2,
-        help='Set the refresh interval in minutes. Cannot be less than 1. Default is 2 minutes.',
+        help="Refresh interval in minutes, for when the response doesn't say when its data next changes (otherwise fetches follow Open-Meteo's updates). Cannot be less than 1. Default is 2 minutes.",
     )
     parser.add_argument(
         '--location',
         type=str,
-        choices=LOCATIONS.keys(),
+        choices=[*LOCATIONS.keys(), ALL_LOCATIONS],
         default='Minneapolis',
-        help=f'Set the location for weather data ({", ".join(LOCATIONS.keys())})',
+        help=f'Set the location for weather data ({", ".join(LOCATIONS.keys())}), or "{ALL_LOCATIONS}" to rotate through every location',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help=f'Directory for the on-disk forecast cache. Default is {DEFAULT_CACHE_DIR}',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always fetch from the API instead of serving cached forecasts',
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=0,
+        help='Serve Prometheus metrics on http://127.0.0.1:<port>/metrics. Off by default',
+    )
+    parser.add_argument(
+        '--metrics-file',
+        type=str,
+        default=None,
+        help='Periodically write Prometheus metrics to this file. Off by default',
+    )
+    parser.add_argument(
+        '--metrics-interval',
+        type=int,
+        default=15,
+        help='How often to rewrite --metrics-file, in seconds. Default is 15',
+    )
+    parser.add_argument(
+        '--record',
+        type=str,
+        default=None,
+        help='Append every raw Open-Meteo response to this file, for --replay',
+    )
+    parser.add_argument(
+        '--capture',
+        type=int,
+        default=DEFAULT_CAPTURE_SIZE,
+        help=f'Keep the last N raw Open-Meteo responses under --cache-dir, written out as a --replay recording on SIGUSR1. 0 turns it off. Default is {DEFAULT_CAPTURE_SIZE}',
+    )
+    parser.add_argument(
+        '--replay',
+        type=str,
+        default=None,
+        help='Replay responses recorded with --record instead of calling the API',
+    )
+    parser.add_argument(
+        '--replay-speed',
+        type=float,
+        default=1.0,
+        help='How fast to play back --replay, as a multiple of real time. Default is 1',
+    )
+    parser.add_argument(
+        '--base-url',
+        type=str,
+        default=None,
+        help=f'Open-Meteo forecast endpoint, e.g. a src.weather.replay stand-in server. Default is {open_meteo.base_url}',
+    )
+    parser.add_argument(
+        '--forecast-days',
+        type=int,
+        default=open_meteo.forecast_days,
+        help=f'Days of hourly forecast to fetch, up to {open_meteo.MAX_FORECAST_DAYS}. Past 4, the forecast rotation shows more of the coming week (up to 6 days). Default is {open_meteo.forecast_days}',
+    )
+    parser.add_argument(
+        '--displays',
+        type=str,
+        default=None,
+        help='JSON file listing the LCD buses and their displays (see src.lcd.load_buses). Default is the three 16x2 LCDs on the built-in pins',
+    )
+    parser.add_argument(
+        '--startup-budget',
+        type=float,
+        default=2.0,
+        help='Seconds after launch to wait for cached weather before showing a splash screen instead. Default is 2',
+    )
+    parser.add_argument(
+        '--startup-profile',
+        action='store_true',
+        help='Log how long imports, LCD init and the first weather took once it is on screen',
     )
     parser.add_argument(
         '--lcd-test',
@@ -61,7 +178,12 @@ def parse_args():
 
 def run_test_pattern(args):
     print('Running LCD test pattern...')
-    lcd_manager = LcdManager(is_dev=args.dev)
+    lcd_manager = LcdManager(
+        is_dev=args.dev,
+        frames_file=args.dev_frames,
+        fps=args.dev_fps,
+        buses=load_buses(args.displays) if args.displays else None,
+    )
     parts = [
         ['A', 'Test', 'Line 1'],
         [
@@ -72,8 +194,9 @@ def run_test_pattern(args):
     ]
 
     for lcd_index in range(len(lcd_manager.lcds)):
-        lcd_manager.set_text_parts(lcd_index, parts, print_dev=True)
+        lcd_manager.set_text_parts(lcd_index, parts)
         time.sleep(2)
+    lcd_manager.stop()
     sys.exit(0)
 
 
@@ -91,20 +214,55 @@ def init_logging(args):
 
 
 def get_weather(
-    location: dict[str, float],
-) -> Weather:
-    return open_meteo.get_weather(location['lat'], location['lon'])
+    locations: dict[str, dict[str, float]],
+    cache: Optional[ForecastCache] = None,
+    on_update: Optional[Callable[[WeatherByLocation], None]] = None,
+    on_error: Optional[open_meteo.RefreshErrorCallback] = None,
+    force: bool = False,
+) -> WeatherByLocation:
+    # every location comes from a single request
+    names = list(locations)
+    coordinates = [(locations[name]['lat'], locations[name]['lon']) for name in names]
+
+    if cache is None:
+        return dict(zip(names, open_meteo.get_weathers(coordinates)))
+    return dict(
+        zip(
+            names,
+            open_meteo.get_cached_weathers(
+                coordinates,
+                cache,
+                on_update=(
+                    (lambda weathers: on_update(dict(zip(names, weathers))))
+                    if on_update
+                    else None
+                ),
+                on_error=on_error,
+                force=force,
+            ),
+        )
+    )
 
 
-def handle_today_display(
-    lcd_index: int,
-    lcd_manager: LcdManager,
-    current_weather: CurrentWeather,
-    today_weather: DailyWeather,
-):
+@open_meteo.uses_fields(
+    current=[
+        'temp',
+        'feels_like',
+        'condition',
+        'wind_speed',
+        'wind_gusts',
+        'wind_dir',
+        'humidity',
+        'uv',
+    ],
+    daily=['temp', 'feels_like', 'precip', 'avg_cloud_cover'],
+)
+def get_today_rotation(
+    current_weather: CurrentWeather, today_weather: DailyWeather, is_stale: bool = False
+) -> list[RotatingPart]:
     current_weather_parts = [
         [
-            f'={current_weather["temp"]}{utils.DEGREES}',
+            f'{utils.STALE if is_stale else "="}{current_weather["temp"]}{utils.DEGREES}',
             f'{utils.APPROX}{current_weather["feels_like"]}{utils.DEGREES}',
             f'{current_weather["condition"]}',
         ],
@@ -126,59 +284,165 @@ def handle_today_display(
         ],
     ]
 
+    return [
+        {
+            'lines_and_parts': current_weather_parts,
+            'duration': 5,
+        },
+        {
+            'lines_and_parts': today_weather_parts,
+            'duration': 5,
+        },
+    ]
+
+
+# see utils.get_daily_weather_output_parts
+@open_meteo.uses_fields(daily=['date', 'temp', 'condition', 'humidity', 'precip'])
+def get_forecast_rotation(forecast: Sequence[DailyWeather]) -> list[RotatingPart]:
+    return [
+        {
+            'lines_and_parts': utils.get_daily_weather_output_parts(day),
+            'duration': 5,
+        }
+        # tomorrow and the next two days, or with a longer horizon the rest of the
+        # week: pages are only labelled by weekday, so a second week would repeat
+        for day in forecast[1 : min(max(4, open_meteo.forecast_days), 7)]
+    ]
+
+
+@open_meteo.uses_fields(
+    hourly=[
+        'time',
+        'temp',
+        'condition',
+        'wind_speed',
+        'wind_gusts',
+        'wind_dir',
+        'precip',
+    ]
+)
+def get_hourly_rotation(
+    hourly_forecast: Sequence[HourlyWeather],
+) -> list[RotatingPart]:
+    return [
+        {
+            'lines_and_parts': [
+                [
+                    f'{hour["time"].strftime("%H")}:',
+                    f'{hour["temp"]}{utils.DEGREES}',
+                    f'{hour["condition"]}',
+                ],
+                [
+                    f'{utils.WIND}{hour["wind_speed"]}/{hour["wind_gusts"]}{hour["wind_dir"]}',
+                    f'{utils.PRECIP}{hour["precip"]}%',
+                ],
+            ],
+            'duration': 3,
+        }
+        for hour in hourly_forecast[2:10:2]  # Every 2 hours, up to 8 hours from now
+    ]
+
+
+def handle_today_display(
+    lcd_index: int,
+    lcd_manager: LcdManager,
+    current_weather: CurrentWeather,
+    today_weather: DailyWeather,
+    is_stale: bool = False,
+):
     lcd_manager.set_rotating_text_parts(
-        lcd_index,
-        [
-            {
-                'lines_and_parts': current_weather_parts,
-                'duration': 5,
-            },
-            {
-                'lines_and_parts': today_weather_parts,
-                'duration': 5,
-            },
-        ],
+        lcd_index, get_today_rotation(current_weather, today_weather, is_stale)
     )
 
 
 def handle_forecast_display(
-    lcd_index: int, lcd_manager: LcdManager, forecast: list[DailyWeather]
+    lcd_index: int, lcd_manager: LcdManager, forecast: Sequence[DailyWeather]
 ):
-    lcd_manager.set_rotating_text_parts(
-        1,
-        [
-            {
-                'lines_and_parts': utils.get_daily_weather_output_parts(day),
-                'duration': 5,
-            }
-            for day in forecast[1:4]
-        ],
-    )
+    lcd_manager.set_rotating_text_parts(lcd_index, get_forecast_rotation(forecast))
 
 
 def handle_hourly_display(
-    lcd_index: int, lcd_manager: LcdManager, hourly_forecast: list[HourlyWeather]
+    lcd_index: int, lcd_manager: LcdManager, hourly_forecast: Sequence[HourlyWeather]
 ):
-    lcd_manager.set_rotating_text_parts(
-        lcd_index,
-        [
-            {
-                'lines_and_parts': [
-                    [
-                        f'{hour["time"].strftime("%H")}:',
-                        f'{hour["temp"]}{utils.DEGREES}',
-                        f'{hour["condition"]}',
-                    ],
-                    [
-                        f'{utils.WIND}{hour["wind_speed"]}/{hour["wind_gusts"]}{hour["wind_dir"]}',
-                        f'{utils.PRECIP}{hour["precip"]}%',
-                    ],
-                ],
-                'duration': 3,
+    lcd_manager.set_rotating_text_parts(lcd_index, get_hourly_rotation(hourly_forecast))
+
+
+WEATHER_AGE = metrics.gauge(
+    'kitchenpi_weather_age_seconds', 'Age of the oldest weather on the displays'
+)
+
+LOCATION_CARD_SECONDS = 2
+
+
+def _is_stale(name: str, weather: Weather, stale_after: float) -> bool:
+    is_stale = time.time() - weather['fetched_at'] > stale_after
+    if is_stale:
+        logger.warning(
+            f'Showing stale weather for {name} from {time.ctime(weather["fetched_at"])}'
+        )
+    return is_stale
+
+
+def _clear_unused(lcd_manager: LcdManager, num_used: int) -> None:
+    # LCDs past the ones in use would otherwise keep the splash (or whatever they
+    # showed for a location that's gone) forever
+    for lcd_index in range(num_used, len(lcd_manager.lcds)):
+        lcd_manager.clear(lcd_index)
+
+
+def display_weather(
+    lcd_manager: LcdManager, weather_by_location: WeatherByLocation, stale_after: float
+):
+    oldest = min(weather['fetched_at'] for weather in weather_by_location.values())
+    WEATHER_AGE.set_function(lambda: time.time() - oldest)
+
+    num_lcds = len(lcd_manager.lcds)
+    if len(weather_by_location) == 1:
+        [(name, weather)] = weather_by_location.items()
+        handle_today_display(
+            0,
+            lcd_manager,
+            weather['current_weather'],
+            weather['daily_forecast'][0],
+            is_stale=_is_stale(name, weather, stale_after),
+        )
+        if num_lcds > 1:
+            handle_forecast_display(1, lcd_manager, weather['daily_forecast'])
+        if num_lcds > 2:
+            handle_hourly_display(2, lcd_manager, weather['hourly_forecast'])
+        _clear_unused(lcd_manager, 3)
+        return
+
+    # several locations: the LCDs are used in groups of three, and every group
+    # cycles through its share of the locations, each location's pages starting
+    # with a card that names it. With enough LCDs every location has its own group
+    names = list(weather_by_location)
+    num_groups = min(len(names), max(1, num_lcds // 3))
+    for group in range(num_groups):
+        rotations: list[list[RotatingPart]] = [[], [], []]
+        for name in names[group::num_groups]:
+            weather = weather_by_location[name]
+            location_rotations = [
+                get_today_rotation(
+                    weather['current_weather'],
+                    weather['daily_forecast'][0],
+                    _is_stale(name, weather, stale_after),
+                ),
+                get_forecast_rotation(weather['daily_forecast']),
+                get_hourly_rotation(weather['hourly_forecast']),
+            ]
+            card: RotatingPart = {
+                'lines_and_parts': [['', name, '']],
+                'duration': LOCATION_CARD_SECONDS,
             }
-            for hour in hourly_forecast[2:10:2]  # Every 2 hours, up to 8 hours from now
-        ],
-    )
+            for rotation, location_rotation in zip(rotations, location_rotations):
+                rotation += [card] + location_rotation
+
+        for offset, rotation in enumerate(rotations):
+            lcd_index = group * 3 + offset
+            if lcd_index < num_lcds:
+                lcd_manager.set_rotating_text_parts(lcd_index, rotation)
+    _clear_unused(lcd_manager, num_groups * 3)
 
 
 def run(args):
@@ -188,27 +452,128 @@ def run(args):
         )
         args.refresh_interval = 1
 
-    lcd_manager = LcdManager(is_dev=args.dev)
+    refresh_seconds = args.refresh_interval * 60
+    # a missed refresh or two is normal, only flag data once it's clearly behind.
+    # Fetches follow Open-Meteo's 15 minute updates, so allow at least two of those
+    stale_after = max(refresh_seconds, CURRENT_INTERVAL_SECONDS) * 2
 
-    while True:
-        try:
-            weather = get_weather(LOCATIONS[args.location])
+    if not 1 <= args.forecast_days <= open_meteo.MAX_FORECAST_DAYS:
+        logger.warning(
+            f'Forecast days must be 1 to {open_meteo.MAX_FORECAST_DAYS}, not {args.forecast_days}.'
+        )
+        args.forecast_days = min(
+            max(args.forecast_days, 1), open_meteo.MAX_FORECAST_DAYS
+        )
+    open_meteo.forecast_days = args.forecast_days
 
-            handle_today_display(
-                0, lcd_manager, weather['current_weather'], weather['daily_forecast'][0]
-            )
-            handle_forecast_display(1, lcd_manager, weather['daily_forecast'])
-            handle_hourly_display(2, lcd_manager, weather['hourly_forecast'])
+    if args.base_url:
+        open_meteo.base_url = args.base_url
+    if args.replay:
+        from src.weather.replay import ReplaySource
+
+        open_meteo.set_source(
+            ReplaySource.from_file(args.replay, speed=args.replay_speed).get
+        )
+    if args.record:
+        from src.weather.replay import Recorder
+
+        open_meteo.add_recorder(Recorder(args.record))
+    if args.capture > 0 and not args.replay:
+        capture = PayloadRing(
+            os.path.join(args.cache_dir, 'payloads'), size=args.capture
+        )
+        open_meteo.add_recorder(capture)
+        # `kill -USR1 <pid>` writes the captured responses out as a recording. Off
+        # the main thread, which is only ever joining the producer
+        signal.signal(
+            signal.SIGUSR1,
+            lambda *_: threading.Thread(target=capture.dump, daemon=True).start(),
+        )
+
+    # recorded or stand-in weather shouldn't end up in the real cache
+    cache = (
+        None
+        if args.no_cache or args.replay or args.base_url
+        else ForecastCache(directory=args.cache_dir, ttl=refresh_seconds)
+    )
+
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    if args.metrics_file:
+        metrics.MetricsFileWriter(args.metrics_file, args.metrics_interval).start()
+
+    # returns straight away, the LCDs are initialized on the bus writer's thread
+    lcd_manager = LcdManager(
+        is_dev=args.dev,
+        frames_file=args.dev_frames,
+        fps=args.dev_fps,
+        cgram_file=os.path.join(args.cache_dir, 'cgram.json'),
+        buses=load_buses(args.displays) if args.displays else None,
+    )
+
+    # the first weather and the splash screen go through the same lock, so a late
+    # splash can never cover weather that's already showing
+    startup_lock = threading.Lock()
+    first_weather = threading.Event()
+
+    def on_snapshot(snapshot):
+        with startup_lock:
+            display_weather(lcd_manager, snapshot.locations, stale_after)
+            if first_weather.is_set():
+                return
+            first_weather.set()
+        PROFILE.mark('first weather')
+        if args.startup_profile:
+            lcd_manager.flush(timeout=10)
+            PROFILE.mark('first weather on screen')
+            logger.info(PROFILE.report(budget=args.startup_budget))
+
+    channel = WeatherChannel()
+    channel.subscribe(on_snapshot)
+    locations = (
+        LOCATIONS
+        if args.location == ALL_LOCATIONS
+        else {args.location: LOCATIONS[args.location]}
+    )
+    producer = WeatherProducer(
+        # background cache refreshes report back to the producer, which publishes
+        # their weather and backs off when they fail like for any other fetch
+        fetch=lambda force: get_weather(
+            locations,
+            cache=cache,
+            force=force,
+            on_update=producer.refreshed,
+            on_error=producer.refresh_failed,
+        ),
+        channel=channel,
+        schedule=FetchSchedule(interval=refresh_seconds),
+        # republished once it goes stale, to mark it on the displays
+        stale_after=stale_after,
+    )
+
+    # `kill -HUP <pid>` fetches new weather without waiting for the interval, even
+    # if the cached weather is still fresh
+    signal.signal(signal.SIGHUP, lambda *_: producer.refresh_now())
+
+    channel.start()
+    producer.start()
 
-            # lcd_manager.print_all()
-        except Exception as e:
-            logger.error(f'Error getting weather data: {e}')
-            logger.debug(traceback.format_exc())
+    # a cached forecast normally makes it well within the budget, the splash is for
+    # the first run, or when the cache is off and the fetch is slow
+    if not first_weather.wait(max(0.0, args.startup_budget - PROFILE.elapsed())):
+        with startup_lock:
+            if not first_weather.is_set():
+                logger.info('No weather yet, showing the splash screen')
+                lcd_manager.show_splash(SPLASH)
+                PROFILE.mark('splash')
 
-        time.sleep(args.refresh_interval * 60)
+    # join with a timeout so the main thread still sees KeyboardInterrupt
+    while producer.is_alive():
+        producer.join(1)
 
 
 def main():
+    PROFILE.add('imports', PROFILE.started, PROFILE.elapsed())
     args = parse_args()
 
     if args.lcd_test:
@@ -0,0 +1,270 @@
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator, Optional
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+logger = logging.getLogger(__name__)
+
+Labels = tuple[tuple[str, str], ...]
+
+# seconds, from a quick GPIO write up to a slow fetch
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _labels(labels: Optional[dict[str, str]]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str) -> None:
+        super().__init__(name, help)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, labels: Optional[dict[str, str]] = None) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, labels: Optional[dict[str, str]] = None) -> float:
+        with self._lock:
+            return self._values.get(_labels(labels), 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values) or {(): 0}
+        return super().render() + [
+            f'{self.name}{_format_labels(labels)} {_format_value(value)}'
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str) -> None:
+        super().__init__(name, help)
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        # evaluated every time the metrics are rendered
+        with self._lock:
+            self._function = function
+
+    def value(self) -> float:
+        with self._lock:
+            function, value = self._function, self._value
+        return function() if function else value
+
+    def render(self) -> list[str]:
+        return super().render() + [f'{self.name} {_format_value(self.value())}']
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self, name: str, help: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts with a final +Inf bucket, sum)
+        self._values: dict[Labels, tuple[list[int], float]] = {}
+
+    def observe(self, value: float, labels: Optional[dict[str, str]] = None) -> None:
+        key = _labels(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or (
+                [0] * (len(self.buckets) + 1),
+                0.0,
+            )
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, labels: Optional[dict[str, str]] = None) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, labels)
+
+    def count(self, labels: Optional[dict[str, str]] = None) -> int:
+        with self._lock:
+            counts, _ = self._values.get(_labels(labels), ([0], 0.0))
+            return sum(counts)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = {k: (list(c), t) for k, (c, t) in self._values.items()}
+        lines = super().render()
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = ('le', _format_value(bound))
+                lines.append(
+                    f'{self.name}_bucket{_format_labels(labels, le)} {cumulative}'
+                )
+            suffix = _format_labels(labels)
+            lines.append(f'{self.name}_sum{suffix} {_format_value(total)}')
+            lines.append(f'{self.name}_count{suffix} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # modules register at import, so hand back the existing one on reload
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))  # type: ignore
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._register(Gauge(name, help))  # type: ignore
+
+    def histogram(
+        self, name: str, help: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, buckets))  # type: ignore
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+# shared by every module that has something to report
+THREADS = gauge('kitchenpi_threads', 'Number of live threads')
+THREADS.set_function(lambda: threading.active_count())
+LOCK_WAIT_SECONDS = histogram(
+    'kitchenpi_lock_wait_seconds', 'Time spent waiting to acquire a shared lock'
+)
+
+
+def start_http_server(
+    port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY
+) -> 'ThreadingHTTPServer':
+    """Serves the metrics as Prometheus text on http://host:port/metrics."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f'Metrics request: {format % args}')
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(
+        target=server.serve_forever, daemon=True, name='metrics-http'
+    ).start()
+    logger.info(f'Serving metrics on http://{host}:{server.server_port}/metrics')
+    return server
+
+
+class MetricsFileWriter(threading.Thread):
+    """
+    Rewrites the metrics to a file every interval seconds, for node_exporter's
+    textfile collector or just cat-ing on the Pi.
+    """
+
+    def __init__(
+        self, path: str, interval: float = 15, registry: Registry = REGISTRY
+    ) -> None:
+        super().__init__(daemon=True, name='metrics-file')
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop_event = threading.Event()
+
+    def write(self) -> None:
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.registry.render())
+        os.replace(tmp_path, self.path)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f'Failed to write metrics to {self.path}: {e}')
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,311 @@
+import functools
+import logging
+import math
+import random
+import threading
+import time
+import traceback
+from typing import Callable, NamedTuple, Optional
+
+from src import metrics
+from src.types import WeatherByLocation
+
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot(NamedTuple):
+    # the weather inside a snapshot is shared by every subscriber, treat it as read-only
+    locations: WeatherByLocation
+    sequence: int
+    published_at: float  # monotonic seconds
+
+
+Subscriber = Callable[[Snapshot], None]
+
+
+class WeatherChannel(threading.Thread):
+    """
+    Latest-value channel between the fetcher and the displays. publish() never
+    blocks on subscribers: they run on this thread, and if several snapshots
+    arrive while they're busy only the newest one is delivered.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(daemon=True, name='weather-channel')
+        self._subscribers: list[Subscriber] = []
+        self._latest: Optional[Snapshot] = None
+        self._delivered = 0
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+
+    @property
+    def latest(self) -> Optional[Snapshot]:
+        return self._latest
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        with self._condition:
+            self._subscribers.append(subscriber)
+            # late subscribers get the current value straight away
+            if self._latest is not None:
+                self._delivered = 0
+                self._condition.notify()
+
+    def publish(self, locations: WeatherByLocation) -> Snapshot:
+        with self._condition:
+            self._sequence += 1
+            self._latest = Snapshot(locations, self._sequence, time.monotonic())
+            self._condition.notify()
+            return self._latest
+
+    def run(self):
+        while not self._stop_event.is_set():
+            with self._condition:
+                while not self._stop_event.is_set() and (
+                    self._latest is None or self._latest.sequence == self._delivered
+                ):
+                    self._condition.wait()
+                if self._stop_event.is_set():
+                    return
+                snapshot = self._latest
+                subscribers = list(self._subscribers)
+                self._delivered = snapshot.sequence
+
+            for subscriber in subscribers:
+                try:
+                    subscriber(snapshot)
+                except Exception as e:
+                    logger.error(f'Weather subscriber failed: {e}')
+                    logger.debug(traceback.format_exc())
+
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+
+
+FETCH_FAILURES = metrics.gauge(
+    'kitchenpi_weather_fetch_failures', 'Weather fetches that failed in a row'
+)
+NEXT_FETCH_SECONDS = metrics.gauge(
+    'kitchenpi_weather_next_fetch_seconds', 'Seconds until the next weather fetch'
+)
+SKIPPED = metrics.counter(
+    'kitchenpi_weather_skipped_total',
+    'Fetched weather not published because it was the same as the last one',
+)
+
+
+class FetchSchedule:
+    """
+    Decides how long to wait before the next fetch. Open-Meteo's current
+    conditions cover a fixed interval (15 minutes) and the forecasts only change
+    when a model run comes in, so after a good fetch this waits until just after
+    the next interval boundary instead of polling. If that boundary has passed
+    and the data hasn't moved on yet, it checks again soon, backing off up to
+    interval. Failed fetches back off exponentially with jitter, and the first
+    good fetch after that goes straight back to the normal schedule.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        min_interval: float = 30,
+        max_interval: float = 1800,
+        publish_lag: float = 60,
+        retry_base: float = 5,
+        max_backoff: float = 300,
+        rand: Optional[random.Random] = None,
+    ) -> None:
+        self.interval = interval  # used when the data doesn't say when it changes
+        self.min_interval = min_interval
+        # a boundary further off than this means the clock or the data is off
+        self.max_interval = max_interval
+        self.publish_lag = publish_lag  # how long after a boundary the data appears
+        self.retry_base = retry_base
+        self.max_backoff = max_backoff
+        self.rand = rand or random.Random()
+        self.failures = 0
+        self._late = 0  # fetches past the boundary that still had the old data
+
+    def on_success(self, next_update_at: Optional[float], now: float) -> float:
+        self.failures = 0
+        if next_update_at is None:
+            self._late = 0
+            return self.interval
+
+        due = next_update_at + self.publish_lag
+        if due > now:
+            self._late = 0
+            # a little jitter so several displays don't all hit the boundary at once
+            delay = due - now + self.rand.uniform(0, self.publish_lag / 4)
+        else:
+            # overdue, but never wait longer than plain polling would
+            self._late += 1
+            delay = min(self.min_interval * 2 ** (self._late - 1), self.interval)
+        return min(max(delay, self.min_interval), self.max_interval)
+
+    def on_failure(self) -> float:
+        self.failures += 1
+        delay = min(self.retry_base * 2 ** (self.failures - 1), self.max_backoff)
+        # "equal jitter": never less than half the backoff, so retries still spread out
+        return self.rand.uniform(delay / 2, delay)
+
+
+class WeatherProducer(threading.Thread):
+    """
+    Fetches weather on the schedule's timing (or as soon as refresh_now() is
+    called) and publishes it to the channel, so a slow or failing request never
+    holds up the displays. Weather parsed from the same response as the last
+    published one isn't published again, unless it has gone stale since.
+
+    fetch is called with force=True after refresh_now(), when cached weather that's
+    still fresh should be fetched again anyway.
+
+    When fetch serves cached weather and refreshes it in the background, pass
+    refreshed and refresh_failed as the refresh's callbacks: the outcome of the
+    refresh is what counts as the fetch succeeding or failing.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[bool], WeatherByLocation],
+        channel: WeatherChannel,
+        schedule: FetchSchedule,
+        stale_after: float = math.inf,
+    ) -> None:
+        super().__init__(daemon=True, name='weather-producer')
+        self.fetch = fetch
+        self.channel = channel
+        self.schedule = schedule
+        self.stale_after = stale_after  # seconds, like display_weather's
+        self._published: Optional[dict[str, tuple[Optional[str], bool]]] = None
+        self._publish_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._refresh = False
+        self._stopped = False
+        self._reschedule: Optional[float] = None  # a new delay from a callback
+        # fetched_at of the weather a failed background refresh left being served.
+        # While fetch keeps serving that weather, its refresh is still failing
+        self._failed_at: Optional[float] = None
+
+    def publish(self, locations: WeatherByLocation) -> bool:
+        """
+        Publishes unless it's the same weather as last time, and just as stale or
+        fresh, so the displays get to mark weather that has aged while unchanged.
+        """
+        now = time.time()
+        key = {
+            name: (
+                weather.get('digest'),
+                now - weather['fetched_at'] > self.stale_after,
+            )
+            for name, weather in locations.items()
+        }
+        with self._publish_lock:
+            digests = [digest for digest, _ in key.values()]
+            if key == self._published and None not in digests:
+                SKIPPED.inc()
+                logger.debug('Weather unchanged, not publishing')
+                return False
+            self._published = key
+            self.channel.publish(locations)
+            return True
+
+    def refreshed(self, locations: WeatherByLocation) -> None:
+        """A background refresh got new weather: publish it, schedule from it."""
+        self.publish(locations)
+        with self._condition:
+            self._failed_at = None
+            self._set_delay(
+                self.schedule.on_success(_next_update(locations), time.time())
+            )
+
+    def refresh_failed(self, error: Exception, serving_fetched_at: float) -> None:
+        """
+        A background refresh failed, so the weather fetched at serving_fetched_at
+        is still what's being served: back off like for any failed fetch.
+        """
+        with self._condition:
+            self._failed_at = serving_fetched_at
+            delay = self.schedule.on_failure()
+            self._set_delay(delay)
+        logger.error(
+            f'Error refreshing weather data (retrying in {delay:.0f}s): {error}'
+        )
+
+    def _set_delay(self, delay: float) -> None:
+        # called with the condition held
+        FETCH_FAILURES.set(self.schedule.failures)
+        self._reschedule = delay
+        self._condition.notify_all()
+
+    def _wait(self, delay: float) -> bool:
+        # returns whether refresh_now() cut it short
+        deadline = time.monotonic() + delay
+        with self._condition:
+            while not self._stopped and not self._refresh:
+                if self._reschedule is not None:
+                    deadline = time.monotonic() + self._reschedule
+                    self._reschedule = None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                logger.debug(f'Next weather fetch in {remaining:.0f}s')
+                NEXT_FETCH_SECONDS.set_function(functools.partial(_remaining, deadline))
+                self._condition.wait(remaining)
+            refresh, self._refresh = self._refresh, False
+            self._reschedule = None
+            return refresh
+
+    def run(self):
+        force = False
+        while not self._stopped:
+            try:
+                locations = self.fetch(force)
+                self.publish(locations)
+                serving = min(weather['fetched_at'] for weather in locations.values())
+                with self._condition:
+                    if self._failed_at is not None and serving <= self._failed_at:
+                        # the weather the refresh failed to replace, and fetch has
+                        # retried the refresh: its callback reschedules this
+                        delay = self.schedule.interval
+                    else:
+                        self._failed_at = None
+                        delay = self.schedule.on_success(
+                            _next_update(locations), time.time()
+                        )
+            except Exception as e:
+                with self._condition:
+                    delay = self.schedule.on_failure()
+                logger.error(
+                    f'Error getting weather data (retrying in {delay:.0f}s): {e}'
+                )
+                logger.debug(traceback.format_exc())
+            FETCH_FAILURES.set(self.schedule.failures)
+            force = self._wait(delay)
+
+    def refresh_now(self):
+        with self._condition:
+            self._refresh = True
+            self._condition.notify_all()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+
+def _next_update(locations: WeatherByLocation) -> Optional[float]:
+    # the soonest any location's data moves on
+    next_updates = [
+        next_update
+        for weather in locations.values()
+        if (next_update := weather.get('next_update_at')) is not None
+    ]
+    return min(next_updates) if next_updates else None
+
+
+def _remaining(deadline: float) -> float:
+    return max(0.0, deadline - time.monotonic())
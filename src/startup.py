@@ -0,0 +1,77 @@
+"""
+Where the time goes between launching the app and the first weather on screen,
+for --startup-profile. Stages can be timed from any thread; the report lists them
+in the order they started, as offsets from the start of the process.
+
+For a per-module breakdown of the import stage, run with python -X importtime.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple, Optional
+
+
+class Stage(NamedTuple):
+    name: str
+    start: float  # seconds since STARTED
+    seconds: float
+
+
+# as close to process start as we can get without the interpreter's own startup
+STARTED = time.perf_counter()
+
+
+class StartupProfile:
+    def __init__(self, started: float = STARTED) -> None:
+        self.started = started
+        self._stages: list[Stage] = []
+        self._marks: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def add(self, name: str, start: float, seconds: float) -> None:
+        with self._lock:
+            self._stages.append(Stage(name, start - self.started, seconds))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter() - start)
+
+    def mark(self, name: str) -> bool:
+        """Records the first time something happened, returns whether this was it."""
+        if name in self._marks:
+            return False
+        with self._lock:
+            if name in self._marks:
+                return False
+            self._marks[name] = self.elapsed()
+            return True
+
+    def marked(self, name: str) -> Optional[float]:
+        return self._marks.get(name)
+
+    def report(self, budget: Optional[float] = None) -> str:
+        with self._lock:
+            stages = sorted(self._stages, key=lambda stage: stage.start)
+            marks = sorted(self._marks.items(), key=lambda mark: mark[1])
+
+        budget_note = f', budget {budget:g}s' if budget is not None else ''
+        lines = [f'Startup profile (seconds since start{budget_note}):']
+        width = max([len(stage.name) for stage in stages] + [len(n) for n, _ in marks])
+        for stage in stages:
+            lines.append(
+                f'  {stage.name:<{width}}  {stage.start:7.3f} +{stage.seconds:.3f}'
+            )
+        for name, at in marks:
+            lines.append(f'  {name:<{width}}  {at:7.3f}')
+        return '\n'.join(lines)
+
+
+PROFILE = StartupProfile()
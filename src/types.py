@@ -1,57 +1,254 @@
 import datetime
-from typing import TypedDict
-
-
-class BaseWeather(TypedDict):
-    condition: str
-    wind_speed: int
-    wind_gusts: int
-    wind_dir: str
+from functools import partial
+from typing import (
+    Any,
+    Iterator,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    TypedDict,
+    TypeVar,
+)
+
+
+R = TypeVar('R', bound='Record')
+
+
+class Record(Mapping[str, Any]):
+    """
+    Immutable record stored in __slots__: no per-instance dict, and safe to share
+    between threads without copying. It's also a read-only Mapping of its fields,
+    so code written for the TypedDicts these replaced (record['temp'], dict(record))
+    keeps working. Subclasses list their own fields in __slots__ and fill them in a
+    keyword-only __init__ through _set, calling the parent's __init__ for the rest.
+    """
+
+    __slots__ = ()
+    _fields: tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._fields = cls._fields + tuple(cls.__dict__.get('__slots__', ()))
+
+    def _set(self, **fields: Any) -> None:
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __hash__(self) -> int:
+        return hash(tuple(self.values()))
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields)
+        return f'{type(self).__name__}({fields})'
+
+    def __reduce__(self) -> Any:
+        return partial(type(self), **dict(self)), ()
+
+    def replace(self: R, **fields: Any) -> R:
+        return type(self)(**{**dict(self), **fields})
+
+
+# fields whose Open-Meteo columns weren't requested are None (see open_meteo.uses_fields).
+# condition and wind_dir are always one of the shared strings from the lookup tables
+# in open_meteo and utils, never a per-record copy
+class BaseWeather(Record):
+    __slots__ = ('condition', 'wind_speed', 'wind_gusts', 'wind_dir')
+    condition: Optional[str]
+    wind_speed: Optional[int]
+    wind_gusts: Optional[int]
+    wind_dir: Optional[str]
+
+    def __init__(
+        self,
+        *,
+        condition: Optional[str],
+        wind_speed: Optional[int],
+        wind_gusts: Optional[int],
+        wind_dir: Optional[str],
+    ) -> None:
+        self._set(
+            condition=condition,
+            wind_speed=wind_speed,
+            wind_gusts=wind_gusts,
+            wind_dir=wind_dir,
+        )
 
 
 class PointInTimeWeather(BaseWeather):
-    temp: int
-    feels_like: int
-    uv: int
-    humidity: int
-    cloud_cover: int
+    __slots__ = ('temp', 'feels_like', 'uv', 'humidity', 'cloud_cover')
+    temp: Optional[int]
+    feels_like: Optional[int]
+    uv: Optional[int]
+    humidity: Optional[int]
+    cloud_cover: Optional[int]
+
+    def __init__(
+        self,
+        *,
+        temp: Optional[int],
+        feels_like: Optional[int],
+        uv: Optional[int],
+        humidity: Optional[int],
+        cloud_cover: Optional[int],
+        **base: Any,
+    ) -> None:
+        super().__init__(**base)
+        self._set(
+            temp=temp,
+            feels_like=feels_like,
+            uv=uv,
+            humidity=humidity,
+            cloud_cover=cloud_cover,
+        )
 
 
 class CurrentWeather(PointInTimeWeather):
-    pass
+    __slots__ = ()
 
 
 class DailyWeather(BaseWeather):
+    __slots__ = (
+        'date',
+        'days_from_now',
+        'temp',
+        'feels_like',
+        'precip',
+        'avg_cloud_cover',
+        'humidity',
+        'hours',
+        'hourly_temp',
+        'peak_gust_time',
+    )
     date: datetime.date
     days_from_now: int
-    temp: list[int]
-    feels_like: list[int]
-    precip: int
-    avg_cloud_cover: int
-    humidity: int
+    temp: tuple[Optional[int], Optional[int]]  # (max, min)
+    feels_like: tuple[Optional[int], Optional[int]]  # (max, min)
+    precip: Optional[int]
+    avg_cloud_cover: Optional[int]
+    humidity: Optional[int]
+    # aggregates over the day's hourly data, which only covers forecast_hours
+    hours: int  # number of hourly points for this day
+    hourly_temp: Optional[tuple[int, int]]  # (max, min)
+    peak_gust_time: Optional[datetime.datetime]
+
+    def __init__(
+        self,
+        *,
+        date: datetime.date,
+        days_from_now: int,
+        temp: tuple[Optional[int], Optional[int]],
+        feels_like: tuple[Optional[int], Optional[int]],
+        precip: Optional[int],
+        avg_cloud_cover: Optional[int],
+        humidity: Optional[int],
+        hours: int,
+        hourly_temp: Optional[tuple[int, int]],
+        peak_gust_time: Optional[datetime.datetime],
+        **base: Any,
+    ) -> None:
+        super().__init__(**base)
+        self._set(
+            date=date,
+            days_from_now=days_from_now,
+            temp=temp,
+            feels_like=feels_like,
+            precip=precip,
+            avg_cloud_cover=avg_cloud_cover,
+            humidity=humidity,
+            hours=hours,
+            hourly_temp=hourly_temp,
+            peak_gust_time=peak_gust_time,
+        )
 
 
 class HourlyWeather(PointInTimeWeather):
+    __slots__ = ('time', 'hours_from_now', 'precip')
     time: datetime.datetime
     hours_from_now: int
-    precip: int
+    precip: Optional[int]
+
+    def __init__(
+        self,
+        *,
+        time: datetime.datetime,
+        hours_from_now: int,
+        precip: Optional[int],
+        **point: Any,
+    ) -> None:
+        super().__init__(**point)
+        self._set(time=time, hours_from_now=hours_from_now, precip=precip)
 
 
 class Weather(TypedDict):
     current_weather: CurrentWeather
-    daily_forecast: list[DailyWeather]
-    hourly_forecast: list[HourlyWeather]
+    # usually columnar (see src.weather.columnar), rows are built on access
+    daily_forecast: Sequence[DailyWeather]
+    hourly_forecast: Sequence[HourlyWeather]
+    fetched_at: float  # epoch seconds
+    digest: Optional[str]  # of the response it was parsed from
+    next_update_at: Optional[float]  # epoch seconds the current conditions move on
+
+
+WeatherByLocation = dict[str, Weather]  # location name -> weather
 
 
 class Pins(TypedDict):
-    rs: int
-    d4: int
-    d5: int
-    d6: int
-    d7: int
-    en: list[int]
+    # board pins or their names like 'D5' (numbers for the mock LCDs)
+    rs: Any
+    d4: Any
+    d5: Any
+    d6: Any
+    d7: Any
+    en: list[Any]
+
+
+class DisplayConfig(TypedDict, total=False):
+    en: Any  # gpio: enable pin, a board pin or its name like 'D16'
+    address: int  # i2c: the backpack's address, like 0x27
+    width: int
+    height: int
+
+
+class BusConfig(TypedDict, total=False):
+    # displays on one bus share its pins and are written one at a time; separate
+    # buses run in parallel
+    name: str
+    driver: str  # 'gpio' (the default) or 'i2c'
+    # board pins or their names: gpio rs and d4-d7, i2c scl and sda (optional)
+    pins: dict[str, Any]
+    displays: list[DisplayConfig]
 
 
 class RotatingPart(TypedDict):
     lines_and_parts: list[list[str]]
     duration: int  # seconds
+
+
+class Frame(NamedTuple):
+    text: str  # justified, one line per row, before glyph translation
+    data: bytes  # width * height cells, glyph-translated, as written to the LCD
+    digest: int  # hash of data, equal digests mean an identical screen
+    glyph_epoch: int  # the GlyphManager epoch data was translated under
+
+
+class CompiledPart(NamedTuple):
+    frame: Frame
+    duration: float  # seconds
@@ -1,17 +1,23 @@
 from __future__ import annotations
 
+import heapq
 import logging
 import threading
 import time
+import traceback
 
-from src.types import DailyWeather, RotatingPart
+from src.metrics import LOCK_WAIT_SECONDS
+from src.types import CompiledPart, DailyWeather
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional, Sequence
 
 if TYPE_CHECKING:
     from src.lcd.lcd_manager import LcdManager
 
 
+logger = logging.getLogger(__name__)
+
+
 # MISC UTILS
 
 
@@ -29,71 +35,157 @@ def get_log_level(level: str) -> int:
         raise Exception(f'Invalid log level: {level}')
 
 
-lcd_manager_lock = threading.Lock()
-thread_update_lock = threading.Lock()
-
+class DisplayScheduler(threading.Thread):
+    """
+    One thread that drives the rotation of every LCD. Each LCD's next frame time is
+    kept in a heap of monotonic deadlines, and each deadline is computed from the
+    previous one rather than from when the frame finished drawing, so slow writes
+    don't make the rotation drift. Waits are on a condition, so set_rotation() and
+    stop() take effect immediately.
+    """
 
-class RotatingDisplayThread(threading.Thread):
-    def __init__(
-        self, rotation: list[RotatingPart], lcd_manager: LcdManager, lcd_index: int
-    ) -> None:
-        super().__init__(daemon=True)
-        self.rotation = rotation
+    def __init__(self, lcd_manager: LcdManager) -> None:
+        super().__init__(daemon=True, name='display-scheduler')
         self.lcd_manager = lcd_manager
-        self.lcd_index = lcd_index
-        self.current_index = 0
-        self._stop_event = threading.Event()
+        self._rotations: dict[int, list[CompiledPart]] = {}
+        self._indexes: dict[int, int] = {}  # the page to show next
+        self._showing: dict[int, int] = {}  # the page on screen
+        # heap of (deadline, lcd_index, generation). Clearing a rotation bumps the
+        # LCD's generation, which drops its entry, so each LCD has at most one
+        self._deadlines: list[tuple[float, int, int]] = []
+        self._generations: dict[int, int] = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def set_rotation(self, lcd_index: int, rotation: list[CompiledPart]) -> None:
+        """
+        Swaps in a new rotation without losing the LCD's place: the next page and
+        its deadline stay as they were, and if the page on screen changed it's
+        redrawn straight away instead of at its next turn. A rotation with a
+        different number of pages starts over from its first page at that turn.
+        """
+        start = time.perf_counter()
+        with self._condition:
+            LOCK_WAIT_SECONDS.observe(
+                time.perf_counter() - start, labels={'lock': self.name}
+            )
+            is_new = lcd_index not in self._rotations
+            if not rotation:
+                if self._rotations.pop(lcd_index, None) is not None:
+                    self._generations[lcd_index] = self._generation(lcd_index) + 1
+                self._showing.pop(lcd_index, None)
+                self._indexes.pop(lcd_index, None)
+                return
+
+            # swapped under the same lock the scheduler reads with, so a frame is
+            # always taken from either the old rotation or the new one
+            previous = self._rotations.get(lcd_index, [])
+            self._rotations[lcd_index] = rotation
+            if len(rotation) != len(previous):
+                # the pages moved, so start again from the first (the location card)
+                self._indexes[lcd_index] = 0
+            if is_new:
+                # the first page goes out right away, not on the scheduler's next
+                # wakeup, so it's already submitted when this returns
+                index = self._indexes.setdefault(lcd_index, 0)
+                self._indexes[lcd_index] = (index + 1) % len(rotation)
+                self._showing[lcd_index] = index
+                heapq.heappush(
+                    self._deadlines,
+                    (
+                        time.monotonic() + rotation[index].duration,
+                        lcd_index,
+                        self._generation(lcd_index),
+                    ),
+                )
+                self._show(lcd_index, rotation[index])
+                self._condition.notify()
+                return
+
+            showing = self._showing.get(lcd_index)
+            if (
+                showing is not None
+                and showing < len(rotation)
+                and (
+                    showing >= len(previous)
+                    or previous[showing].frame.digest != rotation[showing].frame.digest
+                )
+            ):
+                self._show(lcd_index, rotation[showing])
+
+    def _generation(self, lcd_index: int) -> int:
+        return self._generations.get(lcd_index, 0)
+
+    def rotation(self, lcd_index: int) -> list[CompiledPart]:
+        with self._condition:
+            return self._rotations.get(lcd_index, [])
+
+    def _next_due(self) -> Optional[tuple[int, CompiledPart]]:
+        # called with the condition held, waits until a frame is due or we're stopped
+        while not self._stopped:
+            if not self._deadlines:
+                self._condition.wait()
+                continue
+
+            deadline, lcd_index, generation = self._deadlines[0]
+            now = time.monotonic()
+            if deadline > now:
+                self._condition.wait(deadline - now)
+                continue
+
+            heapq.heappop(self._deadlines)
+            rotation = self._rotations.get(lcd_index)
+            if not rotation or generation != self._generation(lcd_index):
+                continue  # the rotation was removed, drop it from the schedule
+
+            index = self._indexes[lcd_index]
+            part = rotation[index]
+            self._indexes[lcd_index] = (index + 1) % len(rotation)
+            self._showing[lcd_index] = index
+
+            next_deadline = deadline + part.duration
+            if next_deadline < now:
+                # we fell a whole frame behind (e.g. the Pi was suspended), resync
+                next_deadline = now + part.duration
+            heapq.heappush(self._deadlines, (next_deadline, lcd_index, generation))
+            return lcd_index, part
+
+        return None
+
+    def _show(self, lcd_index: int, part: CompiledPart) -> None:
+        # called with the condition held, so a set_rotation() redraw and a due frame
+        # can't reach the bus out of order. Submitting never blocks on the bus
+        try:
+            # frames are precompiled, and the bus writer skips unchanged ones
+            self.lcd_manager.show_frame(lcd_index, part.frame)
+        except Exception as e:
+            logger.error(f'Failed to show frame on LCD {lcd_index}: {e}')
+            logger.debug(traceback.format_exc())
 
     def run(self):
-        while not self._stop_event.is_set():
-            with lcd_manager_lock:
-                current_part = self.rotation[self.current_index]
-                self.current_index = (self.current_index + 1) % len(self.rotation)
-                self.lcd_manager.set_text_parts(
-                    self.lcd_index, current_part['lines_and_parts']
-                )
-            time.sleep(current_part['duration'])
+        while True:
+            with self._condition:
+                due = self._next_due()
+                if due is None:
+                    return
+                self._show(*due)
 
     def stop(self):
-        self._stop_event.set()
-
-    def set_rotation(self, rotation: list[RotatingPart]):
-        with thread_update_lock:
-            self.rotation = rotation
-            if self.current_index >= len(self.rotation):
-                self.current_index = 0
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
 
 
 # WEATHER UTILS
 
 
-_WIND_DIRS = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+WIND_DIRS = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
 
 
-def wind_degree_to_dir(deg: int) -> str:
-    if deg == 360:
-        deg = 0
-
-    for idx, dir in enumerate(
-        range(0, 361, 45)
-    ):  # do 360 as well, to catch values west of north
-        if dir - 22.5 < deg < dir + 22.5:
-            return _WIND_DIRS[idx % len(_WIND_DIRS)]
-
-    raise Exception(f'Failed to get wind direction label for direction {deg}')
-
-
-def prob_any_persistence(hourly_pop: list[int], D=2.0) -> int:
-    """
-    D = average duration (hours) of a rain event.
-    s_i = min(p_i / D, 1.0) approximates chance an event starts in hour i.
-    """
-    prob_no_start = 1.0
-    for p in hourly_pop:
-        s = min((p / 100.0) / D, 1.0)
-        prob_no_start *= 1.0 - s
-
-    return round((1.0 - prob_no_start) * 100.0)
+def wind_degree_to_dir(deg: float) -> str:
+    # 45 degree sectors centred on each direction, returning the shared label
+    # strings so records never hold copies of them
+    return WIND_DIRS[int((deg % 360 + 22.5) // 45) % len(WIND_DIRS)]
 
 
 # STRING UTILS
@@ -115,6 +207,37 @@ def justify_text_parts(parts: list[str], width: int) -> str:
     return joined
 
 
+def frame_lines(text: str, width: int, height: int) -> list[str]:
+    # exactly height lines of exactly width characters, what the screen will show
+    lines = text.split('\n')[:height]
+    lines += [''] * (height - len(lines))
+    return [line[:width].ljust(width) for line in lines]
+
+
+def changed_runs(
+    old: Sequence, new: Sequence, max_gap: int = 0
+) -> list[tuple[int, int]]:
+    """
+    Returns (start, end) spans where new differs from old (same length). Runs that
+    are separated by max_gap or fewer unchanged characters are merged into one,
+    for when rewriting a few unchanged characters is cheaper than starting a new run.
+    """
+    runs: list[tuple[int, int]] = []
+    start = last = -1
+    for index, (old_char, new_char) in enumerate(zip(old, new)):
+        if old_char == new_char:
+            continue
+        if start >= 0 and index - last - 1 > max_gap:
+            runs.append((start, last + 1))
+            start = -1
+        if start < 0:
+            start = index
+        last = index
+    if start >= 0:
+        runs.append((start, last + 1))
+    return runs
+
+
 # OUTPUT
 
 
@@ -125,6 +248,7 @@ CLOUD = '☁'
 HUMIDITY = '⸪'
 PRECIP = '🌧'
 SUN = '☼'
+STALE = '*'
 
 
 def get_daily_weather_output_parts(daily_weather: DailyWeather) -> list[list[str]]:
@@ -139,39 +263,3 @@ def get_daily_weather_output_parts(daily_weather: DailyWeather) -> list[list[str
             f'{PRECIP}{daily_weather["precip"]}%',
         ],
     ]
-
-
-def get_lcd_lines(text: str, width=16, height=2) -> list[str]:
-    text_lines = text.split('\n')
-
-    header = '┌' + ('─' * width) + '┐'
-    footer = '└' + ('─' * width) + '┘'
-    return_lines = [header]
-
-    for row in range(0, height):
-        return_lines.append(
-            f'│{text_lines[row].ljust(width) if len(text_lines) > row else "".ljust(width)}│'
-        )
-
-    return_lines.append(footer)
-
-    return return_lines
-
-
-def print_lcds(lcds):
-    # array of arrays: each outer array is an LCD, and each inner array is the array of lines for that LCD
-    lcd_lines = list(
-        map(
-            lambda lcd: get_lcd_lines(lcd.text, width=lcd.width, height=lcd.height),
-            lcds,
-        )
-    )
-
-    max_rows = max(map(lambda _lines: len(_lines), lcd_lines))
-
-    for row in range(0, max_rows):
-        for index, lines in enumerate(lcd_lines):
-            # TODO handle LCDs of different sizes?
-            if len(lines) > row:
-                print(lines[row], end='  ')
-        print()
@@ -0,0 +1,209 @@
+"""
+Per-day figures for a whole forecast at once: the aggregates of each day's hours
+(chance of precipitation, temperature range, peak gust) and the rounded daily
+columns. Rows only read from these, so a 16-day horizon is a few batch operations
+rather than a Python loop per value per row.
+
+Columns of at least NUMPY_MIN_LENGTH values go through NumPy when it's installed,
+anything shorter (the daily columns, a day or a week of hours) through plain
+Python loops, which beat NumPy's per-call overhead at those sizes. Both give the
+same numbers: products are accumulated hour by hour in the same order, rounding
+is half to even in both (numpy.rint and round), and nulls (NaN) are skipped the
+same way. use_numpy=True or False picks a path regardless of length.
+"""
+
+import math
+from typing import Any, Mapping, NamedTuple, Optional
+
+from src.utils import WIND_DIRS, wind_degree_to_dir
+from src.weather.columnar import Column, _numpy
+
+# average duration (hours) of a rain event. An hour with a p% chance of rain is
+# taken to have a min(p / 100 / RAIN_EVENT_HOURS, 1) chance of one starting, and
+# a day's chance of any is one minus the chance that none of its hours start one
+RAIN_EVENT_HOURS = 2.0
+
+# about where NumPy starts winning, on a Pi and on a laptop alike
+NUMPY_MIN_LENGTH = 256
+
+
+class DayAggregate(NamedTuple):
+    precip: Optional[int]  # chance of any precipitation, None without any data
+    temp_max: Optional[int]
+    temp_min: Optional[int]
+    peak_gust: Optional[int]  # index (into the hourly data) of the first highest gust
+
+
+def _get_numpy(use_numpy: Optional[bool], length: int) -> Any:
+    if use_numpy is None:
+        use_numpy = length >= NUMPY_MIN_LENGTH
+    return _numpy() if use_numpy else None
+
+
+def _as_array(numpy: Any, values: Column) -> Any:
+    return numpy.asarray(values, dtype=numpy.float64)
+
+
+def round_all(
+    values: Optional[Column], length: int, use_numpy: Optional[bool] = None
+) -> list[Optional[int]]:
+    """Every value rounded to an int, None for NaN or a missing column."""
+    if values is None:
+        return [None] * length
+    numpy = _get_numpy(use_numpy, length)
+    if numpy is None:
+        return [None if v != v else round(v) for v in values]
+
+    values = _as_array(numpy, values)
+    nan = numpy.isnan(values)
+    rounded: list[Optional[int]] = (
+        numpy.where(nan, 0.0, numpy.rint(values)).astype(numpy.int64).tolist()
+    )
+    for index in numpy.flatnonzero(nan).tolist():
+        rounded[index] = None
+    return rounded
+
+
+def wind_dirs(
+    values: Optional[Column], length: int, use_numpy: Optional[bool] = None
+) -> list[Optional[str]]:
+    """Every bearing binned to its compass point, like wind_degree_to_dir."""
+    if values is None:
+        return [None] * length
+    numpy = _get_numpy(use_numpy, length)
+    if numpy is None:
+        return [None if v != v else wind_degree_to_dir(v) for v in values]
+
+    values = _as_array(numpy, values)
+    nan = numpy.isnan(values)
+    sectors = numpy.floor_divide(numpy.mod(values, 360) + 22.5, 45)
+    sectors = numpy.where(nan, 0.0, sectors).astype(numpy.int64) % len(WIND_DIRS)
+    return [
+        None if is_nan else WIND_DIRS[sector]
+        for sector, is_nan in zip(sectors.tolist(), nan.tolist())
+    ]
+
+
+def _persistence(prob_no_start: float, hours: int) -> Optional[int]:
+    # the chance of any start, from the product of the hours' chances of none
+    if not hours:
+        return None
+    return round((1.0 - float(prob_no_start)) * 100.0)
+
+
+def _python_days(
+    columns: Mapping[str, Column], slices: Mapping[str, tuple[int, int]]
+) -> dict[str, DayAggregate]:
+    pops = columns.get('precipitation_probability')
+    temps = columns.get('temperature_2m')
+    gusts = columns.get('wind_gusts_10m')
+
+    days: dict[str, DayAggregate] = {}
+    for date, (start, end) in slices.items():
+        precip = None
+        if pops is not None:
+            prob_no_start, hours = 1.0, 0
+            for p in pops[start:end]:
+                if p == p:
+                    s = (p / 100.0) / RAIN_EVENT_HOURS
+                    prob_no_start *= 1.0 - (s if s < 1.0 else 1.0)
+                    hours += 1
+            precip = _persistence(prob_no_start, hours)
+
+        temp_max = temp_min = None
+        if temps is not None:
+            day_temps = [t for t in temps[start:end] if t == t]
+            if day_temps:
+                temp_max, temp_min = round(max(day_temps)), round(min(day_temps))
+
+        peak_gust = None
+        if gusts is not None:
+            peak = -math.inf
+            for index in range(start, end):
+                if gusts[index] > peak:  # False for NaN
+                    peak, peak_gust = gusts[index], index
+
+        days[date] = DayAggregate(precip, temp_max, temp_min, peak_gust)
+    return days
+
+
+def _numpy_days(
+    numpy: Any, columns: Mapping[str, Column], slices: Mapping[str, tuple[int, int]]
+) -> dict[str, DayAggregate]:
+    dates = [date for date, (start, end) in slices.items() if end > start]
+    empty: list[Optional[int]] = [None] * len(dates)
+    if dates:
+        bounds = numpy.array([slices[date] for date in dates], dtype=numpy.intp)
+        starts, lengths = bounds[:, 0], bounds[:, 1] - bounds[:, 0]
+        first, last = int(starts[0]), int(bounds[-1, 1])
+        # each hour's row (day) and column (hour of the day) in a days x hours grid
+        rows = numpy.repeat(numpy.arange(len(dates)), lengths)
+        cells = (rows, numpy.arange(first, last) - numpy.repeat(starts, lengths))
+
+    def present(name: str) -> Any:
+        values = columns.get(name)
+        if values is None or not dates:
+            return None
+        return numpy.asarray(values, dtype=numpy.float64)[first:last]
+
+    precips = empty
+    pops = present('precipitation_probability')
+    if pops is not None:
+        nan = numpy.isnan(pops)
+        factors = 1.0 - numpy.minimum((pops / 100.0) / RAIN_EVENT_HOURS, 1.0)
+        factors[nan] = 1.0  # skipped, like the Python loop does
+        # padded with 1.0, and cumprod multiplies left to right like the loop
+        grid = numpy.ones((len(dates), int(lengths.max())))
+        grid[cells] = factors
+        prob_no_start = numpy.cumprod(grid, axis=1)[:, -1]
+        hours = numpy.bincount(rows[~nan], minlength=len(dates))
+        precips = [
+            _persistence(prob, count)
+            for prob, count in zip(prob_no_start.tolist(), hours.tolist())
+        ]
+
+    temp_maxes = temp_mins = empty
+    temps = present('temperature_2m')
+    if temps is not None:
+        # fmax and fmin ignore NaN, and give NaN only for a day of nothing but
+        offsets = starts - first
+        temp_maxes = round_all(numpy.fmax.reduceat(temps, offsets), len(dates), True)
+        temp_mins = round_all(numpy.fmin.reduceat(temps, offsets), len(dates), True)
+
+    peak_gusts = empty
+    gusts = present('wind_gusts_10m')
+    if gusts is not None:
+        peaks = numpy.fmax.reduceat(gusts, starts - first)
+        # the hours at their day's peak. A day with a peak has one, so the first
+        # from the day's start is its first peak hour, like the loop's strict >
+        hits = numpy.flatnonzero(gusts == numpy.repeat(peaks, lengths))
+        found = numpy.searchsorted(hits, starts - first)
+        firsts = numpy.append(hits, -1)[found]  # -1 only for days without a peak
+        peak_gusts = [
+            None if peak != peak else first + index
+            for peak, index in zip(peaks.tolist(), firsts.tolist())
+        ]
+
+    computed = {
+        date: DayAggregate(*values)
+        for date, *values in zip(dates, precips, temp_maxes, temp_mins, peak_gusts)
+    }
+    no_hours = DayAggregate(None, None, None, None)
+    return {date: computed.get(date, no_hours) for date in slices}
+
+
+def day_aggregates(
+    columns: Mapping[str, Column],
+    slices: Mapping[str, tuple[int, int]],
+    use_numpy: Optional[bool] = None,
+) -> dict[str, DayAggregate]:
+    """
+    The DayAggregate of every day in slices ('YYYY-MM-DD' -> the (start, end) of
+    its hours, contiguous and in order like HourlyForecast.day_slices) from the
+    hourly columns.
+    """
+    hours = max((end for _, end in slices.values()), default=0)
+    numpy = _get_numpy(use_numpy, hours)
+    if numpy is None:
+        return _python_days(columns, slices)
+    return _numpy_days(numpy, columns, slices)
@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional, TypedDict
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.getenv('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'kitchenpi'
+)
+
+
+class CacheEntry(TypedDict):
+    fetched_at: float  # epoch seconds
+    payload: Any  # the raw API response
+    digest: Optional[str]  # of the response body, missing from older cache files
+
+
+def cache_key(params: dict[str, Any]) -> str:
+    # lat/lon are part of the params, so this keys on location and query together
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+class ForecastCache:
+    """
+    Keeps the last good raw response per request, in memory and as a gzipped JSON
+    file on disk, so a restart can show something before the first fetch returns.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, ttl: float = 120) -> None:
+        self.directory = directory
+        self.ttl = ttl  # seconds
+        self._entries: dict[str, CacheEntry] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json.gz')
+
+    def load(self, params: dict[str, Any]) -> Optional[CacheEntry]:
+        key = cache_key(params)
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+
+        try:
+            with gzip.open(self._path(key), 'rb') as f:
+                entry: CacheEntry = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f'Failed to read forecast cache {self._path(key)}: {e}')
+            return None
+
+        with self._lock:
+            self._entries.setdefault(key, entry)
+        logger.debug(f'Loaded forecast cache {key} (age: {self.age(entry):.0f}s)')
+        return entry
+
+    def store(
+        self,
+        params: dict[str, Any],
+        payload: Any,
+        fetched_at: Optional[float] = None,
+        digest: Optional[str] = None,
+    ) -> CacheEntry:
+        key = cache_key(params)
+        entry: CacheEntry = {
+            'fetched_at': time.time() if fetched_at is None else fetched_at,
+            'payload': payload,
+            'digest': digest,
+        }
+        with self._lock:
+            self._entries[key] = entry
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # write then rename, so a crash mid-write never leaves a corrupt cache
+            tmp_path = f'{self._path(key)}.tmp'
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                f.write(json.dumps(entry, separators=(',', ':')).encode('utf-8'))
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.error(f'Failed to write forecast cache {self._path(key)}: {e}')
+
+        return entry
+
+    def age(self, entry: CacheEntry) -> float:
+        return max(0.0, time.time() - entry['fetched_at'])
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self.age(entry) < self.ttl
@@ -0,0 +1,95 @@
+"""
+The last few raw Open-Meteo responses, kept on disk for when the displays show
+something odd: `kill -USR1 <pid>` writes them out as a recording that --replay
+(see src.weather.replay) plays back. Bodies are written as they arrived, never
+decoded, re-encoded or logged, so capturing costs one small file write per fetch.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPTURE_SIZE = 8
+
+
+class PayloadRing:
+    """
+    size slot files in directory, overwritten oldest first. Each holds one line of
+    JSON with when the response came, its params and status, then the raw body.
+    """
+
+    def __init__(self, directory: str, size: int = DEFAULT_CAPTURE_SIZE) -> None:
+        self.directory = directory
+        self.size = size
+        self._lock = threading.Lock()
+        self._next = self._after_newest()
+
+    def _path(self, slot: int) -> str:
+        return os.path.join(self.directory, f'{slot}.payload')
+
+    def _after_newest(self) -> int:
+        # carry on after the newest slot, so a restart doesn't overwrite it first
+        newest, newest_slot = -1.0, -1
+        for slot in range(self.size):
+            try:
+                mtime = os.path.getmtime(self._path(slot))
+            except OSError:
+                continue
+            if mtime > newest:
+                newest, newest_slot = mtime, slot
+        return (newest_slot + 1) % self.size
+
+    def record(self, params: dict[str, Any], status: int, body: bytes) -> None:
+        header = {'recorded_at': time.time(), 'params': params, 'status': status}
+        with self._lock:
+            path = self._path(self._next)
+            self._next = (self._next + 1) % self.size
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = f'{path}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(json.dumps(header, separators=(',', ':')).encode('utf-8'))
+                    f.write(b'\n')
+                    f.write(body)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.error(f'Failed to capture response to {path}: {e}')
+
+    def dump(self, path: Optional[str] = None) -> Optional[str]:
+        """
+        Writes the captured responses, oldest first, as a recording to path
+        (default: next to the ring, named by the time). Returns the path, or None
+        if nothing has been captured yet.
+        """
+        recordings = []
+        with self._lock:
+            for slot in range(self.size):
+                try:
+                    with open(self._path(slot), 'rb') as f:
+                        header = json.loads(f.readline())
+                        body = f.read()
+                except (OSError, ValueError):
+                    continue
+                header['body'] = body.decode('utf-8', errors='replace')
+                recordings.append(header)
+        if not recordings:
+            logger.info(f'No responses captured in {self.directory} yet')
+            return None
+
+        recordings.sort(key=lambda recording: recording['recorded_at'])
+        if path is None:
+            path = f'{self.directory}-{time.strftime("%Y%m%d-%H%M%S")}.jsonl'
+        with open(path, 'w') as f:
+            for recording in recordings:
+                f.write(json.dumps(recording, separators=(',', ':')) + '\n')
+        logger.info(
+            f'Wrote {len(recordings)} captured responses to {path}, '
+            f'play them back with --replay {path}'
+        )
+        return path
@@ -0,0 +1,88 @@
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from src.startup import PROFILE
+
+if TYPE_CHECKING:
+    import requests  # type: ignore
+
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 5.0  # seconds
+READ_TIMEOUT = 15.0  # seconds
+POOL_SIZE = 4
+
+
+def _accept_encoding() -> str:
+    # urllib3 only decodes brotli when one of these packages is installed,
+    # so only advertise it if we can actually read it
+    for module in ('brotli', 'brotlicffi'):
+        try:
+            __import__(module)
+            return 'br, gzip, deflate'
+        except ImportError:
+            continue
+    return 'gzip, deflate'
+
+
+_session: Optional['requests.Session'] = None
+_session_lock = threading.Lock()
+
+
+def _create_session() -> 'requests.Session':
+    # requests is slow to import on a Pi Zero, so it's only loaded on the first fetch
+    with PROFILE.stage('import requests'):
+        import requests  # type: ignore
+        from requests.adapters import HTTPAdapter  # type: ignore
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(
+        {
+            'Accept-Encoding': _accept_encoding(),
+            'Connection': 'keep-alive',
+        }
+    )
+    logger.debug(f'Created HTTP session (Accept-Encoding: {_accept_encoding()})')
+    return session
+
+
+def get_session() -> 'requests.Session':
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _create_session()
+        return _session
+
+
+def get(
+    url: str,
+    params: Optional[dict[str, Any]] = None,
+    timeout: Union[float, tuple[float, float], None] = None,
+    compress: bool = True,
+) -> 'requests.Response':
+    """
+    GET through the shared keep-alive session, so repeated fetches reuse the
+    pooled connection instead of paying for a new TCP+TLS handshake each time.
+    timeout is (connect, read) seconds, and defaults to CONNECT_TIMEOUT/READ_TIMEOUT.
+    """
+    return get_session().get(
+        url,
+        params=params,
+        timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT),
+        headers=None if compress else {'Accept-Encoding': 'identity'},
+    )
+
+
+def close() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
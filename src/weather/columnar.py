@@ -0,0 +1,167 @@
+import functools
+import math
+from array import array
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Hashable,
+    Iterator,
+    Mapping,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+    overload,
+)
+
+from src.types import DailyWeather, HourlyWeather
+from src.weather.timestamps import TimeSeries
+
+
+RowT = TypeVar('RowT')
+T = TypeVar('T')
+# the forecast class itself, so row factories can take a HourlyForecast or such
+ForecastT = TypeVar('ForecastT', bound='ColumnarForecast[Any]')
+
+Column = Union[array, Sequence[Any]]
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy() -> Any:
+    # imported on first use, it takes seconds to load on a Pi Zero
+    try:
+        import numpy  # type: ignore
+    except ImportError:
+        return None
+    return numpy
+
+
+def to_column(values: Sequence[Any]) -> Column:
+    """
+    Packs a numeric API column into a flat array of doubles (nulls become NaN),
+    which is a third of the size of a list of Python floats. Anything that isn't
+    numeric, like the time strings, is kept as-is.
+    """
+    try:
+        # straight from the list in C when there are no nulls, as is usual
+        return array('d', values)
+    except TypeError:
+        pass
+    try:
+        return array('d', (math.nan if v is None else v for v in values))
+    except TypeError:
+        return values
+
+
+class ColumnarForecast(Sequence[RowT], Generic[RowT]):
+    """
+    Forecast stored the way Open-Meteo sends it: one column per variable. Rows are
+    only built when indexed, so a display that shows 4 hours out of 384 only pays
+    for 4 rows. Slicing returns a list of rows.
+    """
+
+    def __init__(
+        self: ForecastT,
+        columns: Mapping[str, Any],
+        row_factory: Callable[[ForecastT, int], RowT],
+        length: Optional[int] = None,
+        utc_offset_seconds: int = 0,
+    ) -> None:
+        self._columns: dict[str, Column] = {
+            name: to_column(values) for name, values in columns.items()
+        }
+        self._row_factory: Callable[[Any, int], RowT] = row_factory
+        self._length = (
+            length if length is not None else len(next(iter(columns.values()), []))
+        )
+        self._rows: dict[int, RowT] = {}
+        self._batches: dict[Hashable, Any] = {}
+        self._utc_offset_seconds = utc_offset_seconds
+        self._times: Optional[TimeSeries] = None
+
+    def __len__(self) -> int:
+        return self._length
+
+    @overload
+    def __getitem__(self, index: int) -> RowT: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[RowT]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('forecast index out of range')
+
+        if index not in self._rows:
+            self._rows[index] = self._row_factory(self, index)
+        return self._rows[index]
+
+    def __iter__(self) -> Iterator[RowT]:
+        for i in range(self._length):
+            yield self[i]
+
+    def value(self, name: str, index: int) -> Any:
+        # None for a column that wasn't requested
+        column = self._columns.get(name)
+        return None if column is None else column[index]
+
+    def raw_columns(self) -> Mapping[str, Column]:
+        return self._columns
+
+    def batch(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """
+        Something computed from whole columns at once (see src.weather.aggregate),
+        computed the first time a row asks for it and shared by the others.
+        """
+        if key not in self._batches:
+            self._batches[key] = compute()
+        return self._batches[key]
+
+    @property
+    def times(self) -> TimeSeries:
+        if self._times is None:
+            self._times = TimeSeries(
+                self._columns['time'], utc_offset_seconds=self._utc_offset_seconds
+            )
+        return self._times
+
+    def date_key(self, index: int) -> str:
+        # 'YYYY-MM-DD', straight from the string for iso8601 times
+        value = self._columns['time'][index]
+        if isinstance(value, str):
+            return value[:10]
+        return self.times[index].date().isoformat()
+
+
+class HourlyForecast(ColumnarForecast[HourlyWeather]):
+    _day_slices: Optional[dict[str, tuple[int, int]]] = None
+
+    def day_slices(self) -> dict[str, tuple[int, int]]:
+        """
+        Maps each 'YYYY-MM-DD' date to the (start, end) offsets of its hours, built
+        in one pass over the (sorted) time column and then reused for every day.
+        """
+        if self._day_slices is None:
+            slices: dict[str, tuple[int, int]] = {}
+            times = self._columns['time']
+            if times and isinstance(times[0], str):
+                dates = [time[:10] for time in times]  # see date_key
+            else:
+                dates = [self.date_key(i) for i in range(len(self))]
+            start = 0
+            for i in range(1, len(dates) + 1):
+                if i == len(dates) or dates[i] != dates[start]:
+                    slices[dates[start]] = (start, i)
+                    start = i
+            self._day_slices = slices
+        return self._day_slices
+
+
+class DailyForecast(ColumnarForecast[DailyWeather]):
+    pass
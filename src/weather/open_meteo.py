@@ -1,17 +1,40 @@
+import calendar
+import hashlib
 import json
 import logging
+import math
 import os
-from typing import TypedDict
-from collections import Counter
-import requests  # type: ignore
+import re
+import sys
+import threading
+import time
+import traceback
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    NamedTuple,
+    Optional,
+    TypedDict,
+    TypeVar,
+    Union,
+)
+from collections import Counter, deque
 
+from src import metrics
 from src.types import CurrentWeather, DailyWeather, HourlyWeather, Weather
-from src.utils import (
-    prob_any_persistence,
-    wind_degree_to_dir,
-)
+from src.utils import wind_degree_to_dir
+from src.weather import aggregate, client
+from src.weather.cache import CacheEntry, ForecastCache, cache_key
+from src.weather.columnar import DailyForecast, HourlyForecast
+from src.weather.timestamps import parse_timestamp
 from datetime import datetime
 
+if TYPE_CHECKING:
+    from src.weather.capture import PayloadRing
+    from src.weather.replay import Recorder
+
 
 logger = logging.getLogger(__name__)
 
@@ -21,8 +44,29 @@ api_key_param = {'key': api_key}
 
 base_url = 'https://api.open-meteo.com/v1/forecast'
 
+# days of hourly data to ask for, up to MAX_FORECAST_DAYS. Past 7 the daily
+# forecast is extended to match; per-day figures are computed in batches (see
+# src.weather.aggregate) so a long horizon doesn't slow parsing down
+forecast_days = 1
+MAX_FORECAST_DAYS = 16
+
+# client.get unless set_source() swapped in something else, like a replay.ReplaySource
+_source: Optional[Callable[..., Any]] = None
+# every raw response is passed to these, see add_recorder()
+_recorders: list[Union['Recorder', 'PayloadRing']] = []
+
+
+def set_source(get: Optional[Callable[..., Any]]) -> None:
+    global _source
+    _source = get
 
-class _CurrentWeatherResponse(TypedDict):
+
+def add_recorder(recorder: Union['Recorder', 'PayloadRing']) -> None:
+    _recorders.append(recorder)
+
+
+# only the columns that were requested are present, see FieldRegistry
+class _CurrentWeatherResponse(TypedDict, total=False):
     time: str
     interval: int
     wind_speed_10m: float
@@ -42,7 +86,7 @@ class _CurrentWeatherResponse(TypedDict):
     surface_pressure: float
 
 
-class _DailyWeatherResponse(TypedDict):
+class _DailyWeatherResponse(TypedDict, total=False):
     time: list[str]
     weather_code: list[int]
     temperature_2m_max: list[float]
@@ -59,7 +103,7 @@ class _DailyWeatherResponse(TypedDict):
     relative_humidity_2m_mean: list[int]
 
 
-class _HourlyWeatherResponse(TypedDict):
+class _HourlyWeatherResponse(TypedDict, total=False):
     time: list[str]
     temperature_2m: list[float]
     apparent_temperature: list[float]
@@ -72,121 +116,351 @@ class _HourlyWeatherResponse(TypedDict):
     uv_index: list[float]
 
 
-class _WeatherResponse(TypedDict):
+class _WeatherResponse(TypedDict, total=False):
+    utc_offset_seconds: int
     current: _CurrentWeatherResponse
     daily: _DailyWeatherResponse
     hourly: _HourlyWeatherResponse
 
 
+# Weather field -> the Open-Meteo (section, column) pairs it's parsed from. Times
+# always come back without being asked for, so fields built from them list nothing.
+_FIELD_COLUMNS: dict[str, dict[str, tuple[tuple[str, str], ...]]] = {
+    'current': {
+        'temp': (('current', 'temperature_2m'),),
+        'feels_like': (('current', 'apparent_temperature'),),
+        'condition': (('current', 'weather_code'),),
+        'wind_speed': (('current', 'wind_speed_10m'),),
+        'wind_gusts': (('current', 'wind_gusts_10m'),),
+        'wind_dir': (('current', 'wind_direction_10m'),),
+        'humidity': (('current', 'relative_humidity_2m'),),
+        'cloud_cover': (('current', 'cloud_cover'),),
+        'uv': (('hourly', 'uv_index'),),
+    },
+    'daily': {
+        'date': (),
+        'days_from_now': (),
+        'condition': (('daily', 'weather_code'),),
+        'temp': (('daily', 'temperature_2m_max'), ('daily', 'temperature_2m_min')),
+        'feels_like': (
+            ('daily', 'apparent_temperature_max'),
+            ('daily', 'apparent_temperature_min'),
+        ),
+        # from the hourly data where there is some, the daily max past that
+        'precip': (
+            ('hourly', 'precipitation_probability'),
+            ('daily', 'precipitation_probability_max'),
+        ),
+        'wind_speed': (('daily', 'wind_speed_10m_max'),),
+        'wind_gusts': (('daily', 'wind_gusts_10m_max'),),
+        'wind_dir': (('daily', 'wind_direction_10m_dominant'),),
+        'avg_cloud_cover': (('daily', 'cloud_cover_mean'),),
+        'humidity': (('daily', 'relative_humidity_2m_mean'),),
+        'hours': (),
+        'hourly_temp': (('hourly', 'temperature_2m'),),
+        'peak_gust_time': (('hourly', 'wind_gusts_10m'),),
+    },
+    'hourly': {
+        'time': (),
+        'hours_from_now': (),
+        'temp': (('hourly', 'temperature_2m'),),
+        'feels_like': (('hourly', 'apparent_temperature'),),
+        'precip': (('hourly', 'precipitation_probability'),),
+        'condition': (('hourly', 'weather_code'),),
+        'wind_speed': (('hourly', 'wind_speed_10m'),),
+        'wind_gusts': (('hourly', 'wind_gusts_10m'),),
+        'wind_dir': (('hourly', 'wind_direction_10m'),),
+        'humidity': (('hourly', 'relative_humidity_2m'),),
+        'cloud_cover': (('hourly', 'cloud_cover'),),
+        'uv': (('hourly', 'uv_index'),),
+    },
+}
+
+
+class FieldRegistry:
+    """
+    The Weather fields the displays show, declared with uses_fields(). Requests
+    only ask for the columns those fields are parsed from, and fields whose
+    columns weren't requested come back as None.
+    """
+
+    def __init__(self) -> None:
+        self._fields: dict[str, set[str]] = {
+            section: set() for section in _FIELD_COLUMNS
+        }
+
+    def declare(self, section: str, names: Iterable[str]) -> None:
+        names = set(names)
+        unknown = names - _FIELD_COLUMNS[section].keys()
+        if unknown:
+            raise ValueError(
+                f'Unknown {section} weather fields: {", ".join(sorted(unknown))}'
+            )
+        self._fields[section] |= names
+
+    def columns(self) -> dict[str, str]:
+        """Comma-separated columns per Open-Meteo section, for the request params."""
+        fields = self._fields
+        if not any(fields.values()):
+            # nothing declared (a script calling get_weather directly), ask for all
+            fields = {section: set(names) for section, names in _FIELD_COLUMNS.items()}
+
+        columns: dict[str, set[str]] = {section: set() for section in _FIELD_COLUMNS}
+        for section, names in fields.items():
+            for name in names:
+                for api_section, column in _FIELD_COLUMNS[section][name]:
+                    columns[api_section].add(column)
+        # sorted, so the params (and the cache key) don't depend on declaration order
+        return {
+            section: ','.join(sorted(names))
+            for section, names in columns.items()
+            if names
+        }
+
+
+FIELDS = FieldRegistry()
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+
+def uses_fields(
+    current: Iterable[str] = (), daily: Iterable[str] = (), hourly: Iterable[str] = ()
+) -> Callable[[F], F]:
+    """Declares the Weather fields a display function shows, see FieldRegistry."""
+    FIELDS.declare('current', current)
+    FIELDS.declare('daily', daily)
+    FIELDS.declare('hourly', hourly)
+
+    def decorator(function: F) -> F:
+        return function
+
+    return decorator
+
+
+def _round(value: Optional[float]) -> Optional[int]:
+    # missing columns are None, nulls inside a column are NaN
+    if value is None or math.isnan(value):
+        return None
+    return round(value)
+
+
+def _condition(code: Optional[float]) -> Optional[str]:
+    if code is None or math.isnan(code):
+        return None
+    return weather_code_to_condition(int(code))
+
+
+def _wind_dir(degrees: Optional[float]) -> Optional[str]:
+    if degrees is None or math.isnan(degrees):
+        return None
+    return wind_degree_to_dir(degrees)
+
+
 def _get_current_weather(weather: _WeatherResponse) -> CurrentWeather:
-    current = weather['current']
-    hourly = weather['hourly']
-    return {
-        'temp': round(current['temperature_2m']),
-        'condition': weather_code_to_condition(current['weather_code']),
-        'wind_speed': round(current['wind_speed_10m']),
-        'wind_gusts': round(current['wind_gusts_10m']),
-        'wind_dir': wind_degree_to_dir(current['wind_direction_10m']),
-        'humidity': current['relative_humidity_2m'],
-        'cloud_cover': current['cloud_cover'],
-        'feels_like': round(current['apparent_temperature']),
-        'uv': round(hourly['uv_index'][0]),
-    }
+    current = weather.get('current', {})
+    uv_index = weather.get('hourly', {}).get('uv_index')
+    return CurrentWeather(
+        temp=_round(current.get('temperature_2m')),
+        condition=_condition(current.get('weather_code')),
+        wind_speed=_round(current.get('wind_speed_10m')),
+        wind_gusts=_round(current.get('wind_gusts_10m')),
+        wind_dir=_wind_dir(current.get('wind_direction_10m')),
+        humidity=current.get('relative_humidity_2m'),
+        cloud_cover=current.get('cloud_cover'),
+        feels_like=_round(current.get('apparent_temperature')),
+        uv=_round(uv_index[0]) if uv_index else None,
+    )
 
 
-def _get_daily_weather(weather: _WeatherResponse, day_index: int) -> DailyWeather:
-    daily = weather['daily']
-    hourly = weather['hourly']
-    today_date = daily['time'][day_index]  # Today's date in the format 'YYYY-MM-DD'
-    today_timestamps = len(
-        [timestamp for timestamp in hourly['time'] if timestamp.startswith(today_date)]
+def _daily_rounded(daily: DailyForecast, name: str) -> list[Optional[int]]:
+    # a whole daily column rounded at once, the first time any day is built
+    return daily.batch(
+        ('round', name),
+        lambda: aggregate.round_all(daily.raw_columns().get(name), len(daily)),
     )
-    precip = prob_any_persistence(
-        hourly['precipitation_probability'][:today_timestamps]
+
+
+def _daily_wind_dirs(daily: DailyForecast) -> list[Optional[str]]:
+    return daily.batch(
+        'wind_dirs',
+        lambda: aggregate.wind_dirs(
+            daily.raw_columns().get('wind_direction_10m_dominant'), len(daily)
+        ),
     )
-    return {
-        'date': datetime.strptime(daily['time'][day_index], '%Y-%m-%d').date(),
-        'days_from_now': 0,
-        'condition': weather_code_to_condition(daily['weather_code'][0]),
-        'temp': [
-            round(daily['temperature_2m_max'][day_index]),
-            round(daily['temperature_2m_min'][day_index]),
-        ],
-        'feels_like': [
-            round(daily['apparent_temperature_max'][day_index]),
-            round(daily['apparent_temperature_min'][day_index]),
-        ],
-        'precip': precip,
-        'wind_speed': round(daily['wind_speed_10m_max'][day_index]),
-        'wind_gusts': round(daily['wind_gusts_10m_max'][day_index]),
-        'wind_dir': wind_degree_to_dir(daily['wind_direction_10m_dominant'][day_index]),
-        'avg_cloud_cover': daily['cloud_cover_mean'][day_index],
-        'humidity': daily['relative_humidity_2m_mean'][day_index],
-    }
 
 
-def _get_forecast(weather: _WeatherResponse) -> list[DailyWeather]:
-    daily = weather['daily']
-    num_days = len(daily['time'])
-    return [_get_daily_weather(weather, i) for i in range(num_days)]
-
-
-def _get_hourly_forecast(weather: _WeatherResponse) -> list[HourlyWeather]:
-    hourly = weather['hourly']
-    num_hours = len(hourly['time'])
-    forecast: list[HourlyWeather] = []
-    for i in range(num_hours):
-        forecast.append(
-            {
-                'time': datetime.strptime(hourly['time'][i], '%Y-%m-%dT%H:%M'),
-                'hours_from_now': i,
-                'temp': round(hourly['temperature_2m'][i]),
-                'feels_like': round(hourly['apparent_temperature'][i]),
-                'precip': hourly['precipitation_probability'][i],
-                'condition': weather_code_to_condition(hourly['weather_code'][i]),
-                'wind_speed': round(hourly['wind_speed_10m'][i]),
-                'wind_gusts': round(hourly['wind_gusts_10m'][i]),
-                'wind_dir': wind_degree_to_dir(hourly['wind_direction_10m'][i]),
-                'humidity': hourly['cloud_cover'][i],
-                'cloud_cover': hourly['cloud_cover'][i],
-                'uv': round(hourly['uv_index'][i]),
-            }
-        )
-    return forecast
+def _is_whole_day(hourly: HourlyForecast, start: int, end: int) -> bool:
+    # from midnight to the 23:00 hour, whatever DST did to the number of hours
+    return (
+        end > start
+        and hourly.times[start].hour == 0
+        and hourly.times[end - 1].hour == 23
+    )
+
+
+def _get_daily_weather(
+    daily: DailyForecast, hourly: HourlyForecast, day_index: int
+) -> DailyWeather:
+    today_date = daily.date_key(day_index)  # Today's date in the format 'YYYY-MM-DD'
+    start, end = hourly.day_slices().get(today_date, (0, 0))
+    # what every day's hours add up to, in one batch for the whole horizon
+    days = hourly.batch(
+        'days',
+        lambda: aggregate.day_aggregates(hourly.raw_columns(), hourly.day_slices()),
+    )
+    # forecast_hours count from the current hour, so the last day the hourly data
+    # reaches is cut short. Only today (what's left of it) and whole days use their
+    # hours, the others use the daily figures like the days past forecast_hours
+    day = None
+    if day_index == 0 or _is_whole_day(hourly, start, end):
+        day = days.get(today_date)
+
+    precip = day.precip if day is not None else None
+    if precip is None:
+        precip = _daily_rounded(daily, 'precipitation_probability_max')[day_index]
+
+    hourly_temp: Optional[tuple[int, int]] = None
+    if day is not None and day.temp_max is not None and day.temp_min is not None:
+        hourly_temp = (day.temp_max, day.temp_min)
+
+    peak_gust_time: Optional[datetime] = None
+    if day is not None and day.peak_gust is not None:
+        peak_gust_time = hourly.times[day.peak_gust]
+
+    return DailyWeather(
+        date=daily.times[day_index].date(),
+        days_from_now=day_index,
+        condition=_condition(daily.value('weather_code', day_index)),
+        temp=(
+            _daily_rounded(daily, 'temperature_2m_max')[day_index],
+            _daily_rounded(daily, 'temperature_2m_min')[day_index],
+        ),
+        feels_like=(
+            _daily_rounded(daily, 'apparent_temperature_max')[day_index],
+            _daily_rounded(daily, 'apparent_temperature_min')[day_index],
+        ),
+        precip=precip,
+        wind_speed=_daily_rounded(daily, 'wind_speed_10m_max')[day_index],
+        wind_gusts=_daily_rounded(daily, 'wind_gusts_10m_max')[day_index],
+        wind_dir=_daily_wind_dirs(daily)[day_index],
+        avg_cloud_cover=_daily_rounded(daily, 'cloud_cover_mean')[day_index],
+        humidity=_daily_rounded(daily, 'relative_humidity_2m_mean')[day_index],
+        hours=end - start,
+        hourly_temp=hourly_temp,
+        peak_gust_time=peak_gust_time,
+    )
+
+
+def _get_forecast(
+    weather: _WeatherResponse, hourly_forecast: HourlyForecast
+) -> DailyForecast:
+    return DailyForecast(
+        weather.get('daily', {'time': []}),
+        lambda daily, i: _get_daily_weather(daily, hourly_forecast, i),
+        utc_offset_seconds=weather.get('utc_offset_seconds', 0),
+    )
+
+
+def _get_hourly_weather(hourly: HourlyForecast, i: int) -> HourlyWeather:
+    return HourlyWeather(
+        time=hourly.times[i],
+        hours_from_now=i,
+        temp=_round(hourly.value('temperature_2m', i)),
+        feels_like=_round(hourly.value('apparent_temperature', i)),
+        precip=_round(hourly.value('precipitation_probability', i)),
+        condition=_condition(hourly.value('weather_code', i)),
+        wind_speed=_round(hourly.value('wind_speed_10m', i)),
+        wind_gusts=_round(hourly.value('wind_gusts_10m', i)),
+        wind_dir=_wind_dir(hourly.value('wind_direction_10m', i)),
+        humidity=_round(hourly.value('relative_humidity_2m', i)),
+        cloud_cover=_round(hourly.value('cloud_cover', i)),
+        uv=_round(hourly.value('uv_index', i)),
+    )
+
+
+def _get_hourly_forecast(weather: _WeatherResponse) -> HourlyForecast:
+    return HourlyForecast(
+        weather.get('hourly', {'time': []}),
+        _get_hourly_weather,
+        utc_offset_seconds=weather.get('utc_offset_seconds', 0),
+    )
 
 
-last_50_response_codes: list[int] = []
+last_50_response_codes: deque[int] = deque(maxlen=50)
 num_requests: int = 0
 
+REQUESTS = metrics.counter(
+    'kitchenpi_weather_requests_total', 'Open-Meteo requests by response status'
+)
+ERRORS = metrics.counter(
+    'kitchenpi_weather_errors_total',
+    'Failed Open-Meteo requests (bad status or no response)',
+)
+FETCH_SECONDS = metrics.histogram(
+    'kitchenpi_weather_fetch_seconds', 'Open-Meteo request latency, including decoding'
+)
+PARSE_SECONDS = metrics.histogram(
+    'kitchenpi_weather_parse_seconds', 'Time to turn a response into Weather'
+)
+UNCHANGED = metrics.counter(
+    'kitchenpi_weather_unchanged_total',
+    'Responses identical to one already parsed, which were not parsed again',
+)
 
-def get_weather(lat: float, lon: float) -> Weather:
-    url = base_url
-    params = {
-        'latitude': lat,
-        'longitude': lon,
-        'daily': 'uv_index_max,weather_code,temperature_2m_max,temperature_2m_min,apparent_temperature_max,apparent_temperature_min,precipitation_hours,precipitation_probability_max,wind_speed_10m_max,wind_gusts_10m_max,wind_direction_10m_dominant,cloud_cover_mean,relative_humidity_2m_mean',
-        'hourly': 'uv_index,temperature_2m,apparent_temperature,precipitation_probability,weather_code,cloud_cover,wind_speed_10m,wind_direction_10m,wind_gusts_10m',
-        'current': 'wind_speed_10m,wind_direction_10m,wind_gusts_10m,temperature_2m,relative_humidity_2m,apparent_temperature,is_day,precipitation,rain,showers,snowfall,weather_code,cloud_cover,pressure_msl,surface_pressure',
+
+Coordinates = tuple[float, float]  # (lat, lon)
+
+
+def _get_params(locations: list[Coordinates]) -> dict[str, Any]:
+    # Open-Meteo takes comma-separated coordinates and returns one result per location
+    return {
+        'latitude': ','.join(str(lat) for lat, _ in locations),
+        'longitude': ','.join(str(lon) for _, lon in locations),
+        **FIELDS.columns(),
         'timezone': 'America/Chicago',
         'wind_speed_unit': 'mph',
         'temperature_unit': 'fahrenheit',
         'precipitation_unit': 'inch',
-        'forecast_hours': '24',
+        'forecast_hours': str(24 * forecast_days),
+        # the API's default of 7 days is left out, so the cache key doesn't change
+        **({'forecast_days': str(forecast_days)} if forecast_days > 7 else {}),
     }
 
+
+# generationtime_ms differs on every response, even when the forecast doesn't
+_GENERATION_TIME = re.compile(rb'"generationtime_ms":[^,}]*,?')
+
+
+def _digest(content: bytes) -> str:
+    return hashlib.sha1(_GENERATION_TIME.sub(b'', content)).hexdigest()
+
+
+class _Fetched(NamedTuple):
+    payload: Union[_WeatherResponse, list[_WeatherResponse]]
+    digest: str  # of the response body, equal for an unchanged forecast
+
+
+def _fetch(params: dict[str, Any]) -> _Fetched:
+    url = base_url
+
     logger.debug(f'Fetching weather from Open-Meteo: {url} with params {params}')
 
-    response = requests.get(
-        url,
-        params=params,
-    )
+    start = time.perf_counter()
+    try:
+        response = (_source or client.get)(url, params=params)
+    except Exception:
+        REQUESTS.inc(labels={'status': 'none'})
+        ERRORS.inc()
+        raise
+
+    for recorder in _recorders:
+        recorder.record(params, response.status_code, response.content)
 
     global num_requests
     num_requests += 1
 
+    REQUESTS.inc(labels={'status': str(response.status_code)})
     last_50_response_codes.append(response.status_code)
-    if len(last_50_response_codes) > 50:
-        last_50_response_codes.pop(0)
 
     if num_requests % 25 == 0:
         logger.info(
@@ -197,18 +471,148 @@ def get_weather(lat: float, lon: float) -> Weather:
         logger.error(
             f'Got bad response from Open-Meteo: {response.status_code} {response.text}'
         )
+        ERRORS.inc()
         raise Exception(f'Got bad response from Open-Meteo: {response.status_code}')
 
-    weather: _WeatherResponse = response.json()
-    logger.debug(
-        f'Got weather response (code: {response.status_code}): {json.dumps(weather)}'
-    )
+    # straight from the body's bytes, without response.json()'s decoded str copy.
+    # The body itself isn't logged, see src.weather.capture for that
+    weather = json.loads(response.content)
+    FETCH_SECONDS.observe(time.perf_counter() - start)
+    logger.debug(f'Got weather response ({len(response.content)} bytes)')
+    return _Fetched(weather, _digest(response.content))
+
+
+def _get_next_update_at(weather: _WeatherResponse) -> Optional[float]:
+    # current conditions are for the interval starting at current.time, so the
+    # next ones (and whatever model run came in meanwhile) show up one interval later
+    current = weather.get('current')
+    if not current or 'interval' not in current:
+        return None
+    utc_offset_seconds = weather.get('utc_offset_seconds', 0)
+    start = parse_timestamp(current['time'], utc_offset_seconds)
+    return calendar.timegm(start.timetuple()) - utc_offset_seconds + current['interval']
+
+
+def _parse(
+    weather: _WeatherResponse, fetched_at: float, digest: Optional[str] = None
+) -> Weather:
+    with PARSE_SECONDS.time():
+        hourly_forecast = _get_hourly_forecast(weather)
+        return {
+            'current_weather': _get_current_weather(weather),
+            'daily_forecast': _get_forecast(weather, hourly_forecast),
+            'hourly_forecast': hourly_forecast,
+            'fetched_at': fetched_at,
+            'digest': digest,
+            'next_update_at': _get_next_update_at(weather),
+        }
+
+
+# digest -> what it parsed to, so an unchanged response isn't parsed again
+_parsed: dict[str, list[Weather]] = {}
+_PARSED_SIZE = 4
+
+
+def _parse_all(
+    payload: Union[_WeatherResponse, list[_WeatherResponse]],
+    fetched_at: float,
+    digest: Optional[str] = None,
+) -> list[Weather]:
+    if digest is not None and digest in _parsed:
+        UNCHANGED.inc()
+        return [{**weather, 'fetched_at': fetched_at} for weather in _parsed[digest]]
+
+    # a single location comes back as an object, several as a list of them
+    responses = payload if isinstance(payload, list) else [payload]
+    weathers = [_parse(weather, fetched_at, digest) for weather in responses]
+    if digest is not None:
+        _parsed[digest] = weathers
+        while len(_parsed) > _PARSED_SIZE:
+            del _parsed[next(iter(_parsed))]
+    return weathers
+
+
+def get_weathers(locations: list[Coordinates]) -> list[Weather]:
+    """Weather for every location from one request, in the same order."""
+    fetched = _fetch(_get_params(locations))
+    return _parse_all(fetched.payload, time.time(), fetched.digest)
 
-    return {
-        'current_weather': _get_current_weather(weather),
-        'daily_forecast': _get_forecast(weather),
-        'hourly_forecast': _get_hourly_forecast(weather),
-    }
+
+def get_weather(lat: float, lon: float) -> Weather:
+    return get_weathers([(lat, lon)])[0]
+
+
+_refreshing: set[str] = set()
+_refreshing_lock = threading.Lock()
+
+
+def _store(params: dict[str, Any], cache: ForecastCache) -> CacheEntry:
+    fetched = _fetch(params)
+    return cache.store(params, fetched.payload, digest=fetched.digest)
+
+
+RefreshErrorCallback = Callable[[Exception, float], None]
+
+
+def _refresh(
+    params: dict[str, Any],
+    cache: ForecastCache,
+    stale: CacheEntry,
+    on_update: Optional[Callable[[list[Weather]], None]],
+    on_error: Optional[RefreshErrorCallback],
+) -> None:
+    key = cache_key(params)
+    try:
+        entry = _store(params, cache)
+    except Exception as e:
+        logger.error(f'Background weather refresh failed, serving cached data: {e}')
+        logger.debug(traceback.format_exc())
+        if on_error:
+            on_error(e, stale['fetched_at'])
+        return
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+    if on_update:
+        on_update(
+            _parse_all(entry['payload'], entry['fetched_at'], entry.get('digest'))
+        )
+
+
+def get_cached_weathers(
+    locations: list[Coordinates],
+    cache: ForecastCache,
+    on_update: Optional[Callable[[list[Weather]], None]] = None,
+    on_error: Optional[RefreshErrorCallback] = None,
+    force: bool = False,
+) -> list[Weather]:
+    """
+    Stale-while-revalidate: a fresh cache entry is returned without a request, an
+    expired one is returned immediately while a background thread refreshes it
+    (calling on_update with the new weather, or on_error with the exception and
+    the fetched_at of the stale weather returned), and the API is only called
+    inline when there is nothing cached at all. Check fetched_at to tell how old
+    it is. force treats a fresh entry as expired, to refresh it now.
+    """
+    params = _get_params(locations)
+    entry = cache.load(params)
+
+    if entry is None:
+        entry = _store(params, cache)
+    elif force or not cache.is_fresh(entry):
+        key = cache_key(params)
+        with _refreshing_lock:
+            start_refresh = key not in _refreshing
+            _refreshing.add(key)
+        if start_refresh:
+            threading.Thread(
+                target=_refresh,
+                args=(params, cache, entry, on_update, on_error),
+                daemon=True,
+            ).start()
+
+    return _parse_all(entry['payload'], entry['fetched_at'], entry.get('digest'))
 
 
 _WEATHER_CODES = {
@@ -246,4 +650,6 @@ _WEATHER_CODES = {
 def weather_code_to_condition(code: int) -> str:
     if code not in _WEATHER_CODES:
         logger.error(f'Got unknown weather code: {code}')
-    return _WEATHER_CODES.get(code, f'{code}(?)')
+        # interned, so every record with this code shares one string too
+        return sys.intern(f'{code}(?)')
+    return _WEATHER_CODES[code]
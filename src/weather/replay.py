@@ -0,0 +1,279 @@
+"""
+Record and replay raw Open-Meteo responses, to drive the app without the network.
+
+    python -m src.main --record weather.jsonl             # record while running normally
+    python -m src.main --replay weather.jsonl --replay-speed 60
+    python -m src.weather.replay weather.jsonl --port 8080 --latency 0.3 --error-rate 0.1
+    python -m src.main --base-url http://127.0.0.1:8080/v1/forecast --no-cache
+
+A recording is one JSON object per line (see Recording), in the order the
+responses arrived. Replaying plays that timeline back at speed times real time:
+a request made t seconds into the replay gets the last response that had been
+recorded t * speed seconds into the recording.
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional, TypedDict
+from urllib.parse import parse_qsl, urlsplit
+
+from src.weather.cache import cache_key
+
+
+logger = logging.getLogger(__name__)
+
+
+class Recording(TypedDict):
+    recorded_at: float  # epoch seconds
+    params: dict[str, Any]
+    status: int
+    body: str
+
+
+class Recorder:
+    """Appends every response to a recording file as it arrives."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, params: dict[str, Any], status: int, body: bytes) -> None:
+        recording: Recording = {
+            'recorded_at': time.time(),
+            'params': params,
+            'status': status,
+            'body': body.decode('utf-8', errors='replace'),
+        }
+        line = json.dumps(recording, separators=(',', ':')) + '\n'
+        try:
+            with self._lock, open(self.path, 'a') as f:
+                f.write(line)
+        except OSError as e:
+            logger.error(f'Failed to record response to {self.path}: {e}')
+
+
+def load_recordings(path: str) -> list[Recording]:
+    with open(path) as f:
+        recordings = [json.loads(line) for line in f if line.strip()]
+    if not recordings:
+        raise ValueError(f'No responses recorded in {path}')
+    return sorted(recordings, key=lambda recording: recording['recorded_at'])
+
+
+class ReplayResponse:
+    """Just enough of requests.Response for open_meteo."""
+
+    def __init__(self, status_code: int, content: bytes) -> None:
+        self.status_code = status_code
+        self.content = content
+        self.headers: dict[str, str] = {'Content-Type': 'application/json'}
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise Exception(f'HTTP {self.status_code}')
+
+
+class ReplaySource:
+    """
+    Serves recorded responses in place of Open-Meteo, following the recording's
+    timeline at speed times real time, and starting over at the end if loop is set.
+    Requests are matched to responses recorded with the same params when there
+    are any, so one recording can hold several locations or queries.
+    """
+
+    def __init__(
+        self,
+        recordings: list[Recording],
+        speed: float = 1.0,
+        loop: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if speed <= 0:
+            raise ValueError('Replay speed must be positive')
+        self.speed = speed
+        self.loop = loop
+        self.clock = clock
+        self._started = clock()
+        self._all = recordings
+        self._by_key: dict[str, list[Recording]] = {}
+        for recording in recordings:
+            self._by_key.setdefault(cache_key(recording['params']), []).append(
+                recording
+            )
+        self._times = {
+            id(timeline): [recording['recorded_at'] for recording in timeline]
+            for timeline in [recordings, *self._by_key.values()]
+        }
+        self._encoded: dict[int, bytes] = {}
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs: Any) -> 'ReplaySource':
+        return cls(load_recordings(path), **kwargs)
+
+    def _timeline(self, params: Optional[dict[str, Any]]) -> list[Recording]:
+        if params is not None:
+            timeline = self._by_key.get(cache_key(params))
+            if timeline:
+                return timeline
+        return self._all
+
+    def current(self, params: Optional[dict[str, Any]] = None) -> Recording:
+        """The recording that's "live" right now for these params."""
+        timeline = self._timeline(params)
+        first = timeline[0]['recorded_at']
+        span = timeline[-1]['recorded_at'] - first
+        elapsed = (self.clock() - self._started) * self.speed
+        if self.loop and span > 0:
+            # give the last response the average gap too before starting over
+            elapsed %= span + span / (len(timeline) - 1)
+        index = bisect.bisect_right(self._times[id(timeline)], first + elapsed)
+        return timeline[max(0, index - 1)]
+
+    def body(self, recording: Recording) -> bytes:
+        key = id(recording)
+        if key not in self._encoded:
+            self._encoded[key] = recording['body'].encode('utf-8')
+        return self._encoded[key]
+
+    def get(
+        self,
+        url: str,
+        params: Optional[dict[str, Any]] = None,
+        timeout: Any = None,
+        compress: bool = True,
+    ) -> ReplayResponse:
+        """Drop-in for client.get, see open_meteo.set_source."""
+        recording = self.current(params)
+        return ReplayResponse(recording['status'], self.body(recording))
+
+
+def serve(
+    source: ReplaySource,
+    port: int = 8080,
+    host: str = '127.0.0.1',
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    rand: Optional[random.Random] = None,
+) -> ThreadingHTTPServer:
+    """
+    Stand-in for the Open-Meteo API over real HTTP, answering any GET with the
+    source's current response (gzipped when the client accepts it). Each request
+    is delayed by latency plus up to jitter seconds, and error_rate of them get
+    a 503 instead.
+    """
+    rand = rand or random.Random()
+    gzipped: dict[int, bytes] = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+        def do_GET(self):
+            time.sleep(latency + rand.uniform(0, jitter))
+            if rand.random() < error_rate:
+                self._send(503, b'{"error":true,"reason":"stand-in error"}')
+                return
+
+            params = dict(parse_qsl(urlsplit(self.path).query))
+            recording = source.current(params)
+            body = source.body(recording)
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                key = id(recording)
+                if key not in gzipped:
+                    gzipped[key] = gzip.compress(body, compresslevel=6)
+                self._send(recording['status'], gzipped[key], encoding='gzip')
+            else:
+                self._send(recording['status'], body)
+
+        def _send(self, status: int, body: bytes, encoding: Optional[str] = None):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f'Stand-in request: {format % args}')
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, daemon=True, name='weather-standin'
+    ).start()
+    logger.info(
+        f'Serving recorded weather on http://{host}:{server.server_port}/v1/forecast'
+    )
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve a recording as a stand-in for the Open-Meteo API'
+    )
+    parser.add_argument('recording', help='File written by --record')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument(
+        '--speed',
+        type=float,
+        default=1.0,
+        help='Replay speed, as a multiple of real time. Default is 1',
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.0,
+        help='Seconds to delay every response. Default is 0',
+    )
+    parser.add_argument(
+        '--jitter',
+        type=float,
+        default=0.0,
+        help='Up to this many seconds of extra random delay. Default is 0',
+    )
+    parser.add_argument(
+        '--error-rate',
+        type=float,
+        default=0.0,
+        help='Fraction of requests answered with a 503. Default is 0',
+    )
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format='[%(asctime)s][%(levelname)s] %(message)s'
+    )
+    server = serve(
+        ReplaySource.from_file(args.recording, speed=args.speed),
+        port=args.port,
+        host=args.host,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rand=random.Random(args.seed),
+    )
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
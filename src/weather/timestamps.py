@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Sequence, Union, overload
+
+
+Timestamp = Union[str, int, float]
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def parse_timestamp(value: Timestamp, utc_offset_seconds: int = 0) -> datetime:
+    """
+    Parses one Open-Meteo timestamp into a naive local datetime. Handles both the
+    default iso8601 output ('2024-01-01T13:00' or '2024-01-01') and
+    timeformat=unixtime, which needs the response's utc_offset_seconds.
+    """
+    if isinstance(value, str):
+        # several times faster than strptime, and Open-Meteo's format is plain ISO
+        return datetime.fromisoformat(value)
+    return _EPOCH + timedelta(seconds=value + utc_offset_seconds)
+
+
+class TimeSeries(Sequence[datetime]):
+    """
+    Decoded time column. Open-Meteo series are evenly spaced, so when the first
+    two timestamps give a step that also lands on the middle and last ones, every
+    other time is computed as start + i * step instead of being parsed. A DST
+    change or a gap shifts the last timestamp and fails that check, in which case
+    each timestamp is parsed (and cached) when it's accessed.
+    """
+
+    def __init__(self, values: Sequence[Timestamp], utc_offset_seconds: int = 0):
+        self._values = values
+        self._utc_offset_seconds = utc_offset_seconds
+        self._parsed: dict[int, datetime] = {}
+        self.start: Optional[datetime] = None
+        self.step: Optional[timedelta] = None
+
+        if len(values) == 1:
+            self.start, self.step = self._parse(0), timedelta(0)
+        elif len(values) > 1:
+            start = self._parse(0)
+            step = self._parse(1) - start
+            last = len(values) - 1
+            if step > timedelta(0) and all(
+                self._parse(i) == start + step * i for i in (last // 2, last)
+            ):
+                self.start, self.step = start, step
+
+    @property
+    def regular(self) -> bool:
+        return self.step is not None
+
+    def _parse(self, index: int) -> datetime:
+        if index not in self._parsed:
+            self._parsed[index] = parse_timestamp(
+                self._values[index], self._utc_offset_seconds
+            )
+        return self._parsed[index]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @overload
+    def __getitem__(self, index: int) -> datetime: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[datetime]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('time series index out of range')
+
+        if self.start is not None and self.step is not None:
+            return self.start + self.step * index
+        return self._parse(index)
+
+    def __iter__(self) -> Iterator[datetime]:
+        if self.start is None or self.step is None:
+            for i in range(len(self)):
+                yield self._parse(i)
+            return
+
+        current = self.start
+        for _ in range(len(self)):
+            yield current
+            current += self.step
@@ -0,0 +1,121 @@
+import math
+import random
+from array import array
+
+import pytest
+
+from src.weather import aggregate
+from src.weather.aggregate import DayAggregate
+
+
+def _column(rng: random.Random, length: int, value) -> array:
+    # about one value in ten is a null, like the API sends for missing hours
+    return array(
+        'd', (math.nan if rng.random() < 0.1 else value() for _ in range(length))
+    )
+
+
+def _slices(rng: random.Random, length: int) -> dict[str, tuple[int, int]]:
+    slices, start = {}, 0
+    while start < length:
+        end = min(length, start + rng.randint(1, 30))
+        slices[f'day-{len(slices)}'] = (start, end)
+        start = end
+    return slices
+
+
+def _random_forecast(seed: int):
+    rng = random.Random(seed)
+    length = rng.randint(0, 400)
+    columns = {
+        'precipitation_probability': _column(
+            rng,
+            length,
+            lambda: rng.choice([0, 100, rng.randint(0, 100), rng.random() * 100]),
+        ),
+        'temperature_2m': _column(
+            rng,
+            length,
+            lambda: rng.choice([rng.randint(-20, 100) + 0.5, rng.uniform(-30, 110)]),
+        ),
+        'wind_gusts_10m': _column(rng, length, lambda: float(rng.randint(0, 30))),
+    }
+    if seed % 7 == 0:
+        del columns['temperature_2m']
+
+    slices = _slices(rng, length)
+    if length and seed % 5 == 0:
+        # a day with nothing but nulls
+        start, end = next(iter(slices.values()))
+        for values in columns.values():
+            for index in range(start, end):
+                values[index] = math.nan
+    if seed % 3 == 0 and len(slices) > 1:
+        # a forecast that starts part way through its hours
+        slices.pop(next(iter(slices)))
+    return rng, length, columns, slices
+
+
+def _persistence(pops: list[float]) -> int:
+    # the rain model as written down, one hour at a time
+    prob_no_start = 1.0
+    for p in pops:
+        prob_no_start *= 1.0 - min((p / 100.0) / aggregate.RAIN_EVENT_HOURS, 1.0)
+    return round((1.0 - prob_no_start) * 100.0)
+
+
+def test_python_days():
+    columns = {
+        'precipitation_probability': array('d', [0, 50, math.nan, 100, 20, 20]),
+        'temperature_2m': array('d', [10.4, 12.5, 9.6, math.nan, math.nan, math.nan]),
+        'wind_gusts_10m': array('d', [5, 9, 9, math.nan, 3, 4]),
+    }
+    slices = {'2024-06-01': (0, 3), '2024-06-02': (3, 6), '2024-06-03': (6, 6)}
+
+    days = aggregate.day_aggregates(columns, slices, use_numpy=False)
+
+    assert days == {
+        '2024-06-01': DayAggregate(_persistence([0, 50]), 12, 10, 1),
+        '2024-06-02': DayAggregate(_persistence([100, 20, 20]), None, None, 5),
+        '2024-06-03': DayAggregate(None, None, None, None),
+    }
+
+
+def test_python_days_without_columns():
+    days = aggregate.day_aggregates({}, {'2024-06-01': (0, 24)}, use_numpy=False)
+    assert days == {'2024-06-01': DayAggregate(None, None, None, None)}
+
+
+def test_python_precip_matches_the_model():
+    for seed in range(100):
+        _, _, columns, slices = _random_forecast(seed)
+        pops = columns['precipitation_probability']
+        days = aggregate.day_aggregates(columns, slices, use_numpy=False)
+        for date, (start, end) in slices.items():
+            present = [p for p in pops[start:end] if p == p]
+            expected = _persistence(present) if present else None
+            assert days[date].precip == expected, (seed, date)
+
+
+def test_numpy_matches_python():
+    pytest.importorskip('numpy')
+    for seed in range(300):
+        rng, length, columns, slices = _random_forecast(seed)
+
+        python = aggregate.day_aggregates(columns, slices, use_numpy=False)
+        numpy = aggregate.day_aggregates(columns, slices, use_numpy=True)
+        assert python == numpy, seed
+        assert list(python) == list(numpy), seed
+
+        values = columns['precipitation_probability']
+        assert aggregate.round_all(values, length, False) == aggregate.round_all(
+            values, length, True
+        ), seed
+        bearings = _column(
+            rng,
+            length,
+            lambda: rng.choice([rng.uniform(-720, 720), 22.5, 337.5, 359.99, 360.0]),
+        )
+        assert aggregate.wind_dirs(bearings, length, False) == aggregate.wind_dirs(
+            bearings, length, True
+        ), seed
@@ -0,0 +1,119 @@
+import pytest
+
+from src.lcd.glyphs import GLYPHS, CgramState
+from src.lcd.lcd_i2c import EN, LCD, FakeExpander
+from src.utils import justify_text_parts
+
+LINES_AND_PARTS = [
+    ['=58°', '≈56°', 'Pt.Cl.'],
+    ['≋6/14SW', '⸪61%'],
+    ['row3', 'x'],
+    ['row4'],
+]
+
+
+def _text(width: int, height: int) -> str:
+    return '\n'.join(
+        justify_text_parts(parts, width).ljust(width)
+        for parts in LINES_AND_PARTS[:height]
+    )
+
+
+def _read(bus: FakeExpander, address: int) -> list[str]:
+    # the decoded screen, with each CGRAM slot shown as the glyph it holds
+    display = bus.displays[address]
+    bitmaps = {tuple(glyph.bitmap): char for char, glyph in GLYPHS.items()}
+    return [
+        ''.join(
+            bitmaps[tuple(display.glyph(ord(c)))] if ord(c) < 8 else c for c in line
+        )
+        for line in display.screen()
+    ]
+
+
+def _lcd(width: int, height: int) -> tuple[LCD, FakeExpander]:
+    bus = FakeExpander(width, height)
+    lcd = LCD(address=0x27, width=width, height=height, i2c=bus)
+    lcd.begin()
+    return lcd, bus
+
+
+@pytest.mark.parametrize('width, height', [(16, 2), (20, 4)])
+def test_frame_decodes_to_the_text(width, height):
+    lcd, bus = _lcd(width, height)
+    bus.transactions.clear()
+
+    text = _text(width, height)
+    lcd.set_text(text)
+
+    display = bus.displays[0x27]
+    assert display.display_on and display.four_bit
+    assert _read(bus, 0x27) == text.split('\n')
+    # glyph uploads included, a frame is one bulk write
+    assert len(bus.transactions) == 1
+
+
+@pytest.mark.parametrize('width, height', [(16, 2), (20, 4)])
+def test_rs_and_enable_timing(width, height):
+    lcd, bus = _lcd(width, height)
+    lcd.set_text(_text(width, height))
+    lcd.set_text(_text(width, height).replace('61%', '62%'))
+
+    assert bus.displays[0x27].setup_violations == 0
+    # every nibble is E high then the same byte with E low, so RS and the data
+    # are already set up when E rises and still held when it falls
+    data = b''.join(buffer for _, buffer in bus.transactions)
+    for index, byte in enumerate(data):
+        if byte & EN:
+            assert data[index + 1] == byte & ~EN
+
+
+@pytest.mark.parametrize('width, height', [(16, 2), (20, 4)])
+def test_only_changed_cells_are_written(width, height):
+    lcd, bus = _lcd(width, height)
+    text = _text(width, height)
+    lcd.set_text(text)
+    before = len(b''.join(buffer for _, buffer in bus.transactions))
+
+    bus.transactions.clear()
+    changed = text.replace('61%', '62%')
+    lcd.set_text(changed)
+
+    # a cursor move and one character, four bytes each, and a byte each time
+    # RS changes
+    assert sum(len(buffer) for _, buffer in bus.transactions) == 10
+    assert sum(len(buffer) for _, buffer in bus.transactions) < before
+    assert _read(bus, 0x27) == changed.split('\n')
+
+    bus.transactions.clear()
+    assert lcd.show(lcd.compile_frames([changed])[0]) is False
+    assert bus.transactions == []
+
+
+def test_clear():
+    lcd, bus = _lcd(20, 4)
+    lcd.set_text(_text(20, 4))
+    lcd.clear()
+    assert bus.displays[0x27].screen() == [' ' * 20] * 4
+
+
+def test_saved_glyphs_are_kept_per_bus(tmp_path):
+    path = str(tmp_path / 'cgram.json')
+    bus_a, bus_b = FakeExpander(), FakeExpander()
+
+    def start() -> tuple[LCD, LCD]:
+        # the same address on two buses, as after every restart
+        state = CgramState(path, boot_id='boot')
+        lcd_a = LCD(0x27, scl='SCL', sda='SDA', i2c=bus_a, cgram_state=state)
+        lcd_b = LCD(0x27, scl='D1', sda='D0', i2c=bus_b, cgram_state=state)
+        return lcd_a, lcd_b
+
+    lcd_a, lcd_b = start()
+    lcd_a.set_text('↑↓→')
+    lcd_b.set_text('°≈≋')
+
+    lcd_a, lcd_b = start()
+    lcd_a.set_text('°≈≋')
+    lcd_b.set_text('↑↓→')
+    assert _read(bus_a, 0x27)[0].startswith('°≈≋')
+    assert _read(bus_b, 0x27)[0].startswith('↑↓→')
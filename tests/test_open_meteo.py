@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from src.weather import aggregate, open_meteo
+
+
+def _payload(start: str, hours: int, days: int) -> dict:
+    first = datetime.fromisoformat(start)
+    times = [first + timedelta(hours=i) for i in range(hours)]
+    dates = [(first + timedelta(days=i)).date() for i in range(days)]
+    return {
+        'utc_offset_seconds': -18000,
+        'hourly': {
+            'time': [time.strftime('%Y-%m-%dT%H:%M') for time in times],
+            'temperature_2m': [50.0 + time.hour for time in times],
+            'precipitation_probability': [60] * hours,
+            'wind_gusts_10m': [10.0 + time.hour for time in times],
+        },
+        'daily': {
+            'time': [date.isoformat() for date in dates],
+            'temperature_2m_max': [80.0] * days,
+            'temperature_2m_min': [40.0] * days,
+            'precipitation_probability_max': [10] * days,
+        },
+    }
+
+
+def _days(payload: dict):
+    return list(open_meteo._parse(payload, fetched_at=0.0)['daily_forecast'])
+
+
+def _chance_of_any(chance: int, hours: int) -> int:
+    none = (1.0 - chance / 100.0 / aggregate.RAIN_EVENT_HOURS) ** hours
+    return round((1.0 - none) * 100.0)
+
+
+def test_hourly_data_starting_mid_day():
+    # forecast_hours=24 fetched at 13:00: 11 hours of today, 13 of tomorrow
+    today, tomorrow = _days(_payload('2024-10-01T13:00', 24, 2))
+
+    # what's left of today comes from its hours
+    assert today.hours == 11
+    assert today.precip == _chance_of_any(60, 11)
+    assert today.hourly_temp == (73, 63)
+    assert today.peak_gust_time == datetime(2024, 10, 1, 23)
+
+    # tomorrow's hours stop at noon, so it uses the daily figures
+    assert tomorrow.hours == 13
+    assert tomorrow.precip == 10
+    assert tomorrow.hourly_temp is None
+    assert tomorrow.peak_gust_time is None
+
+
+def test_whole_days_use_their_hours():
+    today, tomorrow, after = _days(_payload('2024-10-01T13:00', 48, 3))
+
+    assert tomorrow.hours == 24
+    assert tomorrow.precip == _chance_of_any(60, 24)
+    assert tomorrow.hourly_temp == (73, 50)
+    assert tomorrow.peak_gust_time == datetime(2024, 10, 2, 23)
+
+    assert after.precip == 10
+    assert after.hourly_temp is None
@@ -0,0 +1,65 @@
+import random
+import time
+
+from src.pipeline import FetchSchedule, WeatherChannel, WeatherProducer
+
+
+def _schedule(**kwargs) -> FetchSchedule:
+    return FetchSchedule(interval=120, rand=random.Random(0), **kwargs)
+
+
+def test_failures_back_off_exponentially_with_jitter():
+    schedule = _schedule(retry_base=5, max_backoff=300)
+    for failures, backoff in enumerate([5, 10, 20, 40, 80, 160, 300, 300], 1):
+        delay = schedule.on_failure()
+        assert schedule.failures == failures
+        # equal jitter: at least half the backoff, never more than all of it
+        assert backoff / 2 <= delay <= backoff
+
+
+def test_success_after_failures_goes_back_to_the_schedule():
+    schedule = _schedule()
+    for _ in range(5):
+        schedule.on_failure()
+
+    assert schedule.on_success(None, now=1000.0) == 120
+    assert schedule.failures == 0
+    # backing off starts over from the base
+    assert 2.5 <= schedule.on_failure() <= 5
+
+
+def test_success_waits_for_the_next_update():
+    schedule = _schedule(publish_lag=60)
+    delay = schedule.on_success(next_update_at=1600.0, now=1000.0)
+    # the boundary, the publish lag, and up to a quarter of it in jitter
+    assert 660 <= delay <= 675
+
+
+def test_overdue_updates_are_polled_more_and_more_slowly():
+    schedule = _schedule(min_interval=30, publish_lag=60)
+    delays = [schedule.on_success(next_update_at=900.0, now=1000.0) for _ in range(4)]
+    assert delays == [30, 60, 120, 120]
+
+
+def _weather(fetched_at: float) -> dict:
+    return {
+        'here': {
+            'fetched_at': fetched_at,
+            'digest': str(fetched_at),
+            'next_update_at': None,
+        }
+    }
+
+
+def test_failed_background_refreshes_back_off():
+    schedule = _schedule(retry_base=5)
+    producer = WeatherProducer(lambda force: {}, WeatherChannel(), schedule)
+
+    for failures, backoff in enumerate([5, 10, 20], 1):
+        producer.refresh_failed(OSError('down'), serving_fetched_at=1000.0)
+        assert schedule.failures == failures
+        assert backoff / 2 <= producer._reschedule <= backoff
+
+    producer.refreshed(_weather(time.time()))
+    assert schedule.failures == 0
+    assert producer._reschedule == 120
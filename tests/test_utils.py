@@ -0,0 +1,93 @@
+from src.types import CompiledPart, Frame
+from src.utils import DisplayScheduler
+
+
+class _Manager:
+    def __init__(self) -> None:
+        self.shown: list[tuple[int, str]] = []
+
+    def show_frame(self, lcd_index: int, frame: Frame) -> None:
+        self.shown.append((lcd_index, frame.text))
+
+
+def _rotation(*texts: str) -> list[CompiledPart]:
+    # no duration, so every page is due as soon as it's asked for
+    return [CompiledPart(Frame(text, b'', hash(text), 0), 0.0) for text in texts]
+
+
+def _scheduler() -> tuple[DisplayScheduler, _Manager]:
+    manager = _Manager()
+    return DisplayScheduler(manager), manager  # type: ignore[arg-type]
+
+
+def _advance(scheduler: DisplayScheduler, frames: int) -> None:
+    # what the thread does, without the thread
+    with scheduler._condition:
+        for _ in range(frames):
+            due = scheduler._next_due()
+            assert due is not None
+            scheduler._show(*due)
+
+
+def _live_deadlines(scheduler: DisplayScheduler, lcd_index: int) -> int:
+    return sum(
+        1
+        for _, index, generation in scheduler._deadlines
+        if index == lcd_index and generation == scheduler._generation(lcd_index)
+    )
+
+
+def test_rotation_cycles_through_its_pages():
+    scheduler, manager = _scheduler()
+    scheduler.set_rotation(0, _rotation('a', 'b', 'c'))
+    _advance(scheduler, 4)
+    assert [text for _, text in manager.shown] == ['a', 'b', 'c', 'a', 'b']
+
+
+def test_one_deadline_per_lcd_after_clearing():
+    scheduler, manager = _scheduler()
+    for _ in range(3):
+        scheduler.set_rotation(0, _rotation('a', 'b'))
+        scheduler.set_rotation(0, [])
+    scheduler.set_rotation(0, _rotation('a', 'b'))
+    assert _live_deadlines(scheduler, 0) == 1
+
+    manager.shown.clear()
+    _advance(scheduler, 4)
+    assert [text for _, text in manager.shown] == ['b', 'a', 'b', 'a']
+    assert _live_deadlines(scheduler, 0) == 1
+
+
+def test_cleared_rotation_starts_from_its_first_page():
+    scheduler, manager = _scheduler()
+    scheduler.set_rotation(0, _rotation('a0', 'a1', 'a2'))
+    _advance(scheduler, 1)  # a1 on screen, a2 next
+    scheduler.set_rotation(0, [])
+
+    manager.shown.clear()
+    scheduler.set_rotation(0, _rotation('c0', 'c1', 'c2'))
+    _advance(scheduler, 1)
+    assert [text for _, text in manager.shown] == ['c0', 'c1']
+
+
+def test_rotation_with_other_pages_starts_over():
+    scheduler, manager = _scheduler()
+    scheduler.set_rotation(0, _rotation('a0', 'a1', 'a2'))
+    _advance(scheduler, 1)  # a2 next
+
+    manager.shown.clear()
+    scheduler.set_rotation(0, _rotation('card', 'b1', 'b2', 'b3'))
+    _advance(scheduler, 2)
+    # a1's page changed, so it's redrawn, then the rotation starts over
+    assert [text for _, text in manager.shown] == ['b1', 'card', 'b1']
+
+
+def test_same_pages_keep_their_place():
+    scheduler, manager = _scheduler()
+    scheduler.set_rotation(0, _rotation('a0', 'a1', 'a2'))
+    _advance(scheduler, 1)  # a2 next
+
+    manager.shown.clear()
+    scheduler.set_rotation(0, _rotation('a0', 'a1', 'a2'))
+    _advance(scheduler, 1)
+    assert [text for _, text in manager.shown] == ['a2']